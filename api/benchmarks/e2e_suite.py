@@ -0,0 +1,265 @@
+import argparse
+import asyncio
+import contextlib
+import contextvars
+import functools
+import importlib
+import importlib.util
+import inspect
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Dict, List
+
+ROOT = Path(__file__).resolve().parent.parent.parent
+sys.path.insert(0, str(ROOT / "api" / "src"))
+sys.path.append(str(ROOT / "bkk-db" / "seed" / "src"))
+
+BUCKETS = ("db", "service", "serialization")
+timings: contextvars.ContextVar[Dict[str, float] | None] = contextvars.ContextVar("timings", default=None)
+
+
+def load_seeder():
+    spec = importlib.util.spec_from_file_location("seed_main", ROOT / "bkk-db" / "seed" / "src" / "main.py")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def _add(bucket: str, elapsed: float) -> None:
+    current = timings.get()
+    if current is not None:
+        current[bucket] = current.get(bucket, 0.0) + elapsed
+
+
+def instrument(obj: Any, name: str, bucket: str) -> None:
+    func = getattr(obj, name)
+
+    if inspect.isasyncgenfunction(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            gen = func(*args, **kwargs)
+            while True:
+                started = time.perf_counter()
+                try:
+                    item = await gen.__anext__()
+                except StopAsyncIteration:
+                    _add(bucket, time.perf_counter() - started)
+                    return
+                _add(bucket, time.perf_counter() - started)
+                yield item
+    elif inspect.isgeneratorfunction(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            gen = func(*args, **kwargs)
+            while True:
+                started = time.perf_counter()
+                try:
+                    item = next(gen)
+                except StopIteration:
+                    _add(bucket, time.perf_counter() - started)
+                    return
+                _add(bucket, time.perf_counter() - started)
+                yield item
+    elif inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                _add(bucket, time.perf_counter() - started)
+    else:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                _add(bucket, time.perf_counter() - started)
+
+    setattr(obj, name, wrapper)
+
+
+def instrument_app(controller) -> None:
+    import fastapi.routing
+    from starlette.responses import JSONResponse
+
+    repo = controller.service.repo
+    for name in (
+        "get_routes", "iter_latest_trips", "get_latest_trip_local_epochs",
+        "get_trip_aggregates", "get_daily_rollups",
+    ):
+        instrument(repo, name, "db")
+    # Service time includes the repository calls, db time is subtracted when reporting.
+    instrument(controller.service, "get_route_catalog", "service")
+    instrument(controller.service, "get_trip_statistics_batch", "service")
+    instrument(fastapi.routing, "serialize_response", "serialization")
+    instrument(JSONResponse, "render", "serialization")
+
+
+def percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))] if ordered else 0.0
+
+
+async def drive(client, paths: List[str], requests: int, concurrency: int) -> Dict[str, Any]:
+    semaphore = asyncio.Semaphore(concurrency)
+    samples: List[Dict[str, float]] = []
+    errors = 0
+
+    async def one(i: int) -> None:
+        nonlocal errors
+        async with semaphore:
+            breakdown: Dict[str, float] = {}
+            timings.set(breakdown)
+            started = time.perf_counter()
+            resp = await client.get(paths[i % len(paths)])
+            breakdown["latency"] = time.perf_counter() - started
+            if resp.status_code != 200:
+                errors += 1
+            samples.append(breakdown)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(asyncio.create_task(one(i)) for i in range(requests)))
+    elapsed = time.perf_counter() - started
+
+    latencies = [s["latency"] for s in samples]
+    mean = {b: sum(s.get(b, 0.0) for s in samples) / len(samples) for b in BUCKETS}
+    mean["service"] = max(0.0, mean["service"] - mean["db"])
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "errors": errors,
+        "elapsed_s": round(elapsed, 4),
+        "throughput_rps": round(requests / elapsed, 2),
+        "latency_ms": {f"p{int(q * 100)}": round(percentile(latencies, q) * 1000, 3) for q in (0.5, 0.95, 0.99)},
+        "breakdown_mean_ms": {b: round(v * 1000, 3) for b, v in mean.items()},
+    }
+
+
+def reset_database(seeder_module) -> None:
+    import psycopg2
+
+    with psycopg2.connect(**seeder_module.DB_CONFIG) as conn, conn.cursor() as cur:
+        cur.execute("""
+            TRUNCATE trips, trip_latest, routes, trip_stats_daily, trip_stats_watermark RESTART IDENTITY;
+        """)
+
+
+def git_revision() -> str | None:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=ROOT, text=True).strip()
+    except Exception:
+        return None
+
+
+async def run(args) -> Dict[str, Any]:
+    import httpx
+    from config import Config
+
+    config = Config()
+    app = importlib.import_module("main").app
+    controller = importlib.import_module(
+        "controllers.async_trip_controller" if config.API_ASYNC_DB else "controllers.trip_controller"
+    )
+    instrument_app(controller)
+    seeder_module = load_seeder()
+
+    report: Dict[str, Any] = {
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "git_revision": git_revision(),
+        "python": platform.python_version(),
+        "config": {
+            "STATS_ENGINE": config.STATS_ENGINE,
+            "STATS_USE_ROLLUPS": config.STATS_USE_ROLLUPS,
+            "API_CACHE_ENABLED": config.API_CACHE_ENABLED,
+            "API_ROUTES_CACHE_TTL_SECONDS": config.API_ROUTES_CACHE_TTL_SECONDS,
+            "API_ASYNC_DB": config.API_ASYNC_DB,
+            "POSTGRES_POOL_MAX": config.POSTGRES_POOL_MAX,
+        },
+        "scales": [],
+    }
+
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as client:
+            for scale in args.scales:
+                routes, days = (int(v) for v in scale.split("x"))
+                route_ids = seeder_module.route_ids(routes)
+                seeded = None
+                if not args.skip_seed:
+                    reset_database(seeder_module)
+                    started = time.perf_counter()
+                    with contextlib.redirect_stdout(sys.stderr):
+                        seeder_module.TripSeeder(route_ids, seeder_module.DB_CONFIG, days, seed=args.seed).seed()
+                    seeded = round(time.perf_counter() - started, 2)
+                if controller.cache is not None:
+                    controller.cache.clear()
+                if controller.route_cache is not None:
+                    controller.route_cache.clear()
+
+                results = []
+                for concurrency in args.concurrency:
+                    await drive(client, ["/api/trips/routes"], args.warmup, concurrency)
+                    results.append({
+                        "endpoint": "/api/trips/routes",
+                        **await drive(client, ["/api/trips/routes"], args.requests, concurrency),
+                    })
+                    for range_days in args.range_days:
+                        end_date = date.today()
+                        start_date = end_date - timedelta(days=range_days)
+                        paths = [
+                            f"/api/trips/find/{r}?start_date={start_date}&end_date={end_date}" for r in route_ids
+                        ]
+                        await drive(client, paths, args.warmup, concurrency)
+                        results.append({
+                            "endpoint": "/api/trips/find/{route_id}",
+                            "range_days": range_days,
+                            **await drive(client, paths, args.requests, concurrency),
+                        })
+                        print(
+                            f"{scale:>8} | c={concurrency:<3} | {range_days:>3}d | "
+                            f"{results[-1]['throughput_rps']:8.1f} req/s | p99 {results[-1]['latency_ms']['p99']:8.2f} ms",
+                            file=sys.stderr,
+                        )
+                report["scales"].append({
+                    "routes": routes, "days": days, "seed_seconds": seeded, "results": results,
+                })
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Seed a local Postgres at several scales and benchmark the api endpoints in-process. "
+                    "Seeding truncates the trip tables of the database configured by POSTGRES_*."
+    )
+    parser.add_argument("--scales", nargs="+", default=["3x7", "30x30"], help="ROUTESxDAYS to seed")
+    parser.add_argument("--range-days", type=int, nargs="+", default=[1, 7, 30])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=1, help="Random seed of the generated data")
+    parser.add_argument("--skip-seed", action="store_true", help="Benchmark the data already in the database")
+    parser.add_argument("--cache", action="store_true", help="Keep the api statistics and route catalog caches enabled")
+    parser.add_argument("--output", help="Write the JSON report to this file instead of stdout")
+    args = parser.parse_args()
+
+    os.environ["API_CACHE_ENABLED"] = "true" if args.cache else "false"
+    if not args.cache:
+        os.environ["API_ROUTES_CACHE_TTL_SECONDS"] = "0"
+    report = asyncio.run(run(args))
+    output = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+for key in ("POSTGRES_USER", "POSTGRES_PASSWORD", "POSTGRES_DB"):
+    os.environ.setdefault(key, "benchmark")
+
+from config import Config
+from services.trip_service import TripService
+
+
+def generate_trips(count: int, days: int, service: TripService):
+    base = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=days)
+    trips, epochs = [], []
+    for i in range(count):
+        start = base + timedelta(seconds=random.randint(0, days * 86400))
+        end = start + timedelta(minutes=random.randint(50, 80))
+        trips.append({"trip_id": str(i), "start_time": start, "end_time": end, "collected_at": end})
+        start_local = start.astimezone(service.tz).replace(tzinfo=timezone.utc)
+        end_local = end.astimezone(service.tz).replace(tzinfo=timezone.utc)
+        epochs.append((start_local.timestamp(), end_local.timestamp()))
+    return trips, epochs
+
+
+def timed(call, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        call()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare the python and numpy statistics engines of TripService")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    service = TripService(repo=object(), config=Config())
+    end_date = date.today()
+    start_date = end_date - timedelta(days=args.days)
+
+    for size in args.sizes:
+        trips, epochs = generate_trips(size, args.days, service)
+        python_s = timed(lambda: service._build_statistics("bench", start_date, end_date, trips), args.repeat)
+        numpy_s = timed(lambda: service._build_statistics_columnar("bench", start_date, end_date, epochs), args.repeat)
+        print(
+            f"{size:>9} trips | python {python_s * 1000:9.1f} ms | numpy {numpy_s * 1000:8.1f} ms | "
+            f"speedup {python_s / numpy_s:6.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Callable, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from services.async_trip_service import AsyncTripService
+from services.trip_service import TripService
+
+
+def summarize(name: str, latencies: List[float], elapsed: float) -> None:
+    latencies.sort()
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    print(
+        f"{name:>5}: {len(latencies) / elapsed:8.1f} req/s | "
+        f"p50 {statistics.median(latencies) * 1000:7.2f} ms | p99 {p99 * 1000:7.2f} ms"
+    )
+
+
+def bench_sync(call: Callable[[], object], requests: int, concurrency: int) -> None:
+    def timed(_):
+        started = time.perf_counter()
+        call()
+        return time.perf_counter() - started
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        started = time.perf_counter()
+        latencies = list(pool.map(timed, range(requests)))
+        summarize("sync", latencies, time.perf_counter() - started)
+
+
+async def bench_async(call: Callable[[], object], requests: int, concurrency: int) -> None:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def timed():
+        async with semaphore:
+            started = time.perf_counter()
+            await call()
+            return time.perf_counter() - started
+
+    started = time.perf_counter()
+    latencies = await asyncio.gather(*(timed() for _ in range(requests)))
+    summarize("async", list(latencies), time.perf_counter() - started)
+
+
+async def run_async(args, start_date: date, end_date: date) -> None:
+    service = AsyncTripService()
+    async with service.repo.db:
+        await bench_async(
+            lambda: service.get_trip_statistics(args.route_id, start_date, end_date),
+            args.requests, args.concurrency
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare the sync and async TripService paths against a seeded Postgres")
+    parser.add_argument("--route-id", default="0050")
+    parser.add_argument("--days", type=int, default=7)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    args = parser.parse_args()
+
+    end_date = date.today()
+    start_date = end_date - timedelta(days=args.days)
+
+    service = TripService()
+    with service.repo.db:
+        bench_sync(
+            lambda: service.get_trip_statistics(args.route_id, start_date, end_date),
+            args.requests, args.concurrency
+        )
+
+    asyncio.run(run_async(args, start_date, end_date))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
+from psycopg import AsyncCursor
+from psycopg.conninfo import make_conninfo
+from psycopg_pool import AsyncConnectionPool
+from config import Config
+
+class AsyncDBConnection:
+    def __init__(self, config: Config):
+        self.pool = AsyncConnectionPool(
+            make_conninfo(
+                dbname=config.POSTGRES_DB,
+                user=config.POSTGRES_USER,
+                password=config.POSTGRES_PASSWORD,
+                host=config.POSTGRES_HOST,
+                port=config.POSTGRES_PORT
+            ),
+            min_size=config.POSTGRES_POOL_MIN,
+            max_size=config.POSTGRES_POOL_MAX,
+            timeout=config.POSTGRES_POOL_TIMEOUT,
+            check=AsyncConnectionPool.check_connection,
+            open=False
+        )
+
+    @asynccontextmanager
+    async def cursor(self, name: Optional[str] = None) -> AsyncIterator[AsyncCursor]:
+        async with self.pool.connection() as conn:
+            async with (conn.cursor(name=name) if name else conn.cursor()) as cur:
+                yield cur
+
+    async def open(self):
+        await self.pool.open()
+
+    async def close(self):
+        await self.pool.close()
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
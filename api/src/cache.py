@@ -0,0 +1,121 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from zoneinfo import ZoneInfo
+from config import Config
+
+CacheKey = Tuple[str, date, date]
+
+class StatisticsCache:
+    def __init__(self, config: Config):
+        self.tz = ZoneInfo(config.TZ)
+        self.max_bytes = config.API_CACHE_MAX_BYTES
+        self.ttl = config.API_CACHE_TTL_SECONDS
+        self.historical_ttl = config.API_CACHE_HISTORICAL_TTL_SECONDS
+        self._entries: "OrderedDict[CacheKey, Tuple[float, int, Dict[str, Any]]]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def _today(self) -> date:
+        return datetime.now(self.tz).date()
+
+    def _remove(self, key: CacheKey) -> None:
+        _, size, _ = self._entries.pop(key)
+        self._size -= size
+
+    def get(self, key: CacheKey) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, _, value = entry
+            if expires_at < time.monotonic():
+                self._remove(key)
+                self.evictions += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: CacheKey, value: Dict[str, Any]) -> None:
+        size = len(json.dumps(value, default=str))
+        if size > self.max_bytes:
+            return
+        ttl = self.historical_ttl if key[2] < self._today() else self.ttl
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + ttl, size, value)
+            self._size += size
+            while self._size > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate_routes(self, route_ids: Iterable[str]) -> int:
+        route_ids = set(route_ids)
+        affected_from = self._today() - timedelta(days=1)
+        with self._lock:
+            keys = [k for k in self._entries if k[0] in route_ids and k[2] >= affected_from]
+            for key in keys:
+                self._remove(key)
+            self.invalidations += len(keys)
+        return len(keys)
+
+    def clear(self) -> None:
+        with self._lock:
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+            self._size = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._size,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+class RouteCatalogCache:
+    def __init__(self, config: Config):
+        self.ttl = config.API_ROUTES_CACHE_TTL_SECONDS
+        self._routes: Optional[List[Dict[str, Any]]] = None
+        self._route_ids: frozenset = frozenset()
+        self._expires_at = 0.0
+        self._lock = threading.Lock()
+
+    def get(self) -> Optional[List[Dict[str, Any]]]:
+        with self._lock:
+            if self._routes is None or self._expires_at < time.monotonic():
+                return None
+            return self._routes
+
+    def put(self, routes: List[Dict[str, Any]]) -> None:
+        with self._lock:
+            self._routes = routes
+            self._route_ids = frozenset(r["route_id"] for r in routes)
+            self._expires_at = time.monotonic() + self.ttl
+
+    def invalidate_routes(self, route_ids: Iterable[str]) -> int:
+        with self._lock:
+            if self._routes is None or set(route_ids) <= self._route_ids:
+                return 0
+            self._routes = None
+            return 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._routes = None
@@ -0,0 +1,81 @@
+import logging
+import select
+import threading
+from typing import Optional, Sequence
+import psycopg2
+from psycopg2 import extensions
+from cache import RouteCatalogCache, StatisticsCache
+from config import Config
+from route_updates import RouteUpdateBroadcaster
+
+logger = logging.getLogger(__name__)
+
+TRIPS_UPDATED_CHANNEL = "trips_updated"
+
+class CacheInvalidationListener(threading.Thread):
+    def __init__(
+        self, config: Config, caches: Sequence[StatisticsCache | RouteCatalogCache],
+        broadcaster: Optional[RouteUpdateBroadcaster] = None, poll_seconds: float = 5.0, retry_seconds: float = 5.0
+    ):
+        super().__init__(name="cache-invalidation-listener", daemon=True)
+        self.config = config
+        self.caches = caches
+        self.broadcaster = broadcaster
+        self.poll_seconds = poll_seconds
+        self.retry_seconds = retry_seconds
+        self._stop_event = threading.Event()
+
+    def _connect(self) -> extensions.connection:
+        conn = psycopg2.connect(
+            dbname=self.config.POSTGRES_DB,
+            user=self.config.POSTGRES_USER,
+            password=self.config.POSTGRES_PASSWORD,
+            host=self.config.POSTGRES_HOST,
+            port=self.config.POSTGRES_PORT
+        )
+        conn.set_isolation_level(extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+        with conn.cursor() as cur:
+            cur.execute(f"LISTEN {TRIPS_UPDATED_CHANNEL};")
+        return conn
+
+    def _listen(self, conn: extensions.connection) -> None:
+        while not self._stop_event.is_set():
+            if select.select([conn], [], [], self.poll_seconds) == ([], [], []):
+                continue
+            conn.poll()
+            route_ids = set()
+            while conn.notifies:
+                notify = conn.notifies.pop(0)
+                route_ids.update(r for r in notify.payload.split(",") if r)
+            if route_ids:
+                evicted = sum(cache.invalidate_routes(route_ids) for cache in self.caches)
+                logger.debug("Invalidated %d cache entries for routes %s", evicted, sorted(route_ids))
+                # Subscribers hear about an update only once the caches no longer serve the old data.
+                if self.broadcaster is not None:
+                    self.broadcaster.publish(route_ids)
+
+    def run(self) -> None:
+        while not self._stop_event.is_set():
+            conn = None
+            try:
+                conn = self._connect()
+                # Notifications may have been missed while disconnected.
+                self._clear()
+                if self.broadcaster is not None:
+                    self.broadcaster.publish(None)
+                logger.info("Listening for %s notifications", TRIPS_UPDATED_CHANNEL)
+                self._listen(conn)
+            except Exception as e:
+                logger.warning("Cache invalidation listener failed, retrying: %s", e)
+                self._clear()
+                self._stop_event.wait(self.retry_seconds)
+            finally:
+                if conn is not None:
+                    conn.close()
+
+    def _clear(self) -> None:
+        for cache in self.caches:
+            cache.clear()
+
+    def stop(self) -> None:
+        self._stop_event.set()
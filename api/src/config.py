@@ -7,6 +7,24 @@ class Config:
         self.POSTGRES_DB: str = self._get_env("POSTGRES_DB", required=True)
         self.POSTGRES_HOST: str = os.getenv("POSTGRES_HOST", "localhost")
         self.POSTGRES_PORT: int = self._get_int_env("POSTGRES_PORT", 5432)
+        self.POSTGRES_POOL_MIN: int = self._get_int_env("POSTGRES_POOL_MIN", 1)
+        self.POSTGRES_POOL_MAX: int = self._get_int_env("POSTGRES_POOL_MAX", 10)
+        self.POSTGRES_POOL_TIMEOUT: int = self._get_int_env("POSTGRES_POOL_TIMEOUT", 30)
+
+        self.API_CACHE_ENABLED: bool = self._get_bool_env("API_CACHE_ENABLED", True)
+        self.API_CACHE_MAX_BYTES: int = self._get_int_env("API_CACHE_MAX_BYTES", 64 * 1024 * 1024)
+        self.API_CACHE_TTL_SECONDS: int = self._get_int_env("API_CACHE_TTL_SECONDS", 60)
+        self.API_CACHE_HISTORICAL_TTL_SECONDS: int = self._get_int_env("API_CACHE_HISTORICAL_TTL_SECONDS", 24 * 3600)
+        self.API_ROUTES_CACHE_TTL_SECONDS: int = self._get_int_env("API_ROUTES_CACHE_TTL_SECONDS", 60)
+
+        self.API_BATCH_MAX_ROUTES: int = self._get_int_env("API_BATCH_MAX_ROUTES", 500)
+        self.API_CURSOR_BATCH_SIZE: int = self._get_int_env("API_CURSOR_BATCH_SIZE", 5000)
+
+        self.API_ASYNC_DB: bool = self._get_bool_env("API_ASYNC_DB", False)
+        self.API_UPDATES_HEARTBEAT_SECONDS: int = self._get_int_env("API_UPDATES_HEARTBEAT_SECONDS", 15)
+
+        self.STATS_ENGINE: str = self._get_choice_env("STATS_ENGINE", "sql", ("sql", "python", "numpy"))
+        self.STATS_USE_ROLLUPS: bool = self._get_bool_env("STATS_USE_ROLLUPS", True)
 
         self.TZ: str = os.getenv("TZ", "Europe/Budapest")
 
@@ -21,3 +39,19 @@ class Config:
             return int(os.getenv(key, str(default)))
         except ValueError:
             raise ValueError(f"Environment variable {key} must be an integer")
+
+    def _get_choice_env(self, key: str, default: str, choices: tuple) -> str:
+        value = os.getenv(key, default).lower()
+        if value not in choices:
+            raise ValueError(f"Environment variable {key} must be one of: {', '.join(choices)}")
+        return value
+
+    def _get_bool_env(self, key: str, default: bool) -> bool:
+        value = os.getenv(key)
+        if value is None:
+            return default
+        if value.lower() in ("1", "true", "yes", "on"):
+            return True
+        if value.lower() in ("0", "false", "no", "off"):
+            return False
+        raise ValueError(f"Environment variable {key} must be a boolean")
@@ -0,0 +1,101 @@
+from contextlib import asynccontextmanager
+from typing import List
+from fastapi import APIRouter, FastAPI, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from datetime import date, timedelta
+from services.async_trip_service import AsyncTripService
+from services.async_export_service import AsyncTripExportService
+from services.export_service import TripExportEncoder
+from cache import RouteCatalogCache, StatisticsCache
+from cache_invalidation import CacheInvalidationListener
+from config import Config
+from route_updates import RouteUpdateBroadcaster
+
+router = APIRouter()
+config = Config()
+cache = StatisticsCache(config) if config.API_CACHE_ENABLED else None
+route_cache = RouteCatalogCache(config) if config.API_ROUTES_CACHE_TTL_SECONDS > 0 else None
+service = AsyncTripService(config=config, cache=cache, route_cache=route_cache)
+broadcaster = RouteUpdateBroadcaster()
+export_service = AsyncTripExportService(service.repo, config)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await service.repo.db.open()
+    await service.check_rollup_periods()
+    caches = [c for c in (cache, route_cache) if c is not None]
+    listener = CacheInvalidationListener(config, caches, broadcaster)
+    listener.start()
+    yield
+    listener.stop()
+    await service.repo.db.close()
+
+@router.get("/routes")
+async def list_routes(details: bool = Query(False, description="Include first/last activity and trip counts")):
+    routes = await service.get_route_catalog()
+    response = {"routes": [r["route_id"] for r in routes]}
+    if details:
+        response["details"] = routes
+    return response
+
+@router.get("/updates")
+async def route_updates():
+    return StreamingResponse(
+        broadcaster.stream(config.API_UPDATES_HEARTBEAT_SECONDS),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.get("/cache/stats")
+async def cache_stats():
+    return cache.stats() if cache is not None else {"enabled": False}
+
+@router.get("/find/{route_id}")
+async def find_route(
+    route_id: str,
+    start_date: date | None = Query(None, description="YYYY-MM-DD"),
+    end_date: date | None = Query(None, description="YYYY-MM-DD")
+):
+    if not start_date or not end_date:
+        end_date = date.today()
+        start_date = end_date - timedelta(days=7)
+
+    return await service.get_trip_statistics(route_id, start_date, end_date)
+
+@router.get("/batch")
+async def find_routes(
+    route_ids: List[str] = Query(..., description="Route IDs, repeated or comma separated"),
+    start_date: date | None = Query(None, description="YYYY-MM-DD"),
+    end_date: date | None = Query(None, description="YYYY-MM-DD")
+):
+    route_ids = list(dict.fromkeys(r for value in route_ids for r in value.split(",") if r))
+    if len(route_ids) > config.API_BATCH_MAX_ROUTES:
+        raise HTTPException(status_code=400, detail=f"At most {config.API_BATCH_MAX_ROUTES} route IDs are allowed")
+
+    if not start_date or not end_date:
+        end_date = date.today()
+        start_date = end_date - timedelta(days=7)
+
+    return {
+        "interval": {"start_date": start_date.isoformat(), "end_date": end_date.isoformat()},
+        "routes": await service.get_trip_statistics_batch(route_ids, start_date, end_date)
+    }
+
+@router.get("/export/{route_id}")
+async def export_route(
+    route_id: str,
+    start_date: date | None = Query(None, description="YYYY-MM-DD"),
+    end_date: date | None = Query(None, description="YYYY-MM-DD"),
+    format: str = Query("ndjson", pattern="^(ndjson|csv|arrow)$")
+):
+    if not start_date or not end_date:
+        end_date = date.today()
+        start_date = end_date - timedelta(days=7)
+
+    encoder = TripExportEncoder(format)
+    extension = "arrows" if format == "arrow" else format
+    return StreamingResponse(
+        export_service.stream(encoder, route_id, start_date, end_date),
+        media_type=encoder.media_type,
+        headers={"Content-Disposition": f'attachment; filename="trips_{route_id}_{start_date}_{end_date}.{extension}"'}
+    )
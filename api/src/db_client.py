@@ -1,27 +1,75 @@
+import threading
+from contextlib import contextmanager
+from typing import Iterator, Optional
 import psycopg2
+from psycopg2 import extensions, pool
 from config import Config
 
 class DBConnection:
     def __init__(self, config: Config):
-        self.conn = psycopg2.connect(
+        self.pool = pool.ThreadedConnectionPool(
+            config.POSTGRES_POOL_MIN,
+            config.POSTGRES_POOL_MAX,
             dbname=config.POSTGRES_DB,
             user=config.POSTGRES_USER,
             password=config.POSTGRES_PASSWORD,
             host=config.POSTGRES_HOST,
             port=config.POSTGRES_PORT
         )
+        self.checkout_timeout = config.POSTGRES_POOL_TIMEOUT
+        self._slots = threading.BoundedSemaphore(config.POSTGRES_POOL_MAX)
 
-    def cursor(self):
-        return self.conn.cursor()
+    @staticmethod
+    def _is_usable(conn: extensions.connection) -> bool:
+        return not conn.closed and conn.get_transaction_status() != extensions.TRANSACTION_STATUS_UNKNOWN
 
-    def commit(self):
-        self.conn.commit()
+    @classmethod
+    def _is_alive(cls, conn: extensions.connection) -> bool:
+        if not cls._is_usable(conn):
+            return False
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+        except psycopg2.Error:
+            return False
+        return True
 
-    def rollback(self):
-        self.conn.rollback()
+    def _checkout(self) -> extensions.connection:
+        # Idle connections die silently on server restarts and network drops, so ping before handing one out.
+        # Once the pool has discarded as many as it can hold, getconn connects afresh.
+        for _ in range(self.pool.maxconn):
+            conn = self.pool.getconn()
+            if self._is_alive(conn):
+                return conn
+            self.pool.putconn(conn, close=True)
+        return self.pool.getconn()
+
+    @contextmanager
+    def connection(self) -> Iterator[extensions.connection]:
+        if not self._slots.acquire(timeout=self.checkout_timeout):
+            raise pool.PoolError("Timed out waiting for a database connection")
+        conn = None
+        try:
+            conn = self._checkout()
+            yield conn
+            conn.commit()
+        except Exception:
+            if conn is not None and self._is_usable(conn):
+                conn.rollback()
+            raise
+        finally:
+            if conn is not None:
+                self.pool.putconn(conn, close=not self._is_usable(conn))
+            self._slots.release()
+
+    @contextmanager
+    def cursor(self, name: Optional[str] = None) -> Iterator[extensions.cursor]:
+        with self.connection() as conn:
+            with conn.cursor(name=name) as cur:
+                yield cur
 
     def close(self):
-        self.conn.close()
+        self.pool.closeall()
 
     def __enter__(self):
         return self
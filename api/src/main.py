@@ -1,9 +1,17 @@
 from fastapi import FastAPI
-from controllers import trip_controller
+from config import Config
+from metrics import MetricsMiddleware, metrics_endpoint
 
 def create_app() -> FastAPI:
-    app = FastAPI(title="API")
+    if Config().API_ASYNC_DB:
+        from controllers import async_trip_controller as trip_controller
+    else:
+        from controllers import trip_controller
+
+    app = FastAPI(title="API", lifespan=trip_controller.lifespan)
     app.include_router(trip_controller.router, prefix="/api/trips", tags=["Trips"])
+    app.add_route("/metrics", metrics_endpoint, include_in_schema=False)
+    app.add_middleware(MetricsMiddleware)
     return app
 
 app = create_app()
@@ -0,0 +1,107 @@
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, Optional, Sequence, TypeVar
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Histogram, generate_latest, multiprocess
+from starlette.requests import Request
+from starlette.responses import Response
+
+T = TypeVar("T", bound=Sequence)
+
+REQUEST_SECONDS = Histogram(
+    "api_request_duration_seconds", "Request latency by handler", ["method", "handler", "status"],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+)
+DB_QUERY_SECONDS = Histogram(
+    "api_db_query_seconds", "Database round trip time by query", ["query"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+)
+DB_ROWS_FETCHED = Counter("api_db_rows_fetched_total", "Rows fetched by query", ["query"])
+AGGREGATION_SECONDS = Histogram(
+    "api_aggregation_seconds", "TripService aggregation time by stats engine", ["engine"],
+    buckets=(0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1)
+)
+
+_request_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar("request_timings", default=None)
+
+def _add_timing(name: str, seconds: float) -> None:
+    timings = _request_timings.get()
+    if timings is not None:
+        timings[name] = timings.get(name, 0.0) + seconds
+
+class QueryTiming:
+    def __init__(self):
+        self.rows = 0
+
+    def fetched(self, rows: T) -> T:
+        self.rows += len(rows)
+        return rows
+
+@contextmanager
+def db_query(query: str) -> Iterator[QueryTiming]:
+    timing = QueryTiming()
+    started = time.perf_counter()
+    try:
+        yield timing
+    finally:
+        elapsed = time.perf_counter() - started
+        DB_QUERY_SECONDS.labels(query).observe(elapsed)
+        if timing.rows:
+            DB_ROWS_FETCHED.labels(query).inc(timing.rows)
+        _add_timing("db", elapsed)
+
+@contextmanager
+def aggregation(engine: str) -> Iterator[None]:
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        AGGREGATION_SECONDS.labels(engine).observe(elapsed)
+        _add_timing("agg", elapsed)
+
+def server_timing(timings: Dict[str, float], total: float) -> str:
+    entries = [f"{name};dur={seconds * 1000:.2f}" for name, seconds in timings.items()]
+    entries.append(f"total;dur={total * 1000:.2f}")
+    return ", ".join(entries)
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings: Dict[str, float] = {}
+        token = _request_timings.set(timings)
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                header = server_timing(timings, time.perf_counter() - started)
+                message["headers"] = [*message.get("headers", ()), (b"server-timing", header.encode("latin-1"))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            # Label by handler name so path parameters do not blow up cardinality.
+            endpoint = scope.get("endpoint")
+            REQUEST_SECONDS.labels(
+                scope["method"], getattr(endpoint, "__name__", "unmatched"), str(status)
+            ).observe(time.perf_counter() - started)
+            _request_timings.reset(token)
+
+def metrics_endpoint(request: Request) -> Response:
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        # With several uvicorn workers each one writes its samples there, merge them on scrape.
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
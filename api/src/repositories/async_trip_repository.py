@@ -0,0 +1,76 @@
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence, Tuple
+from datetime import date, time
+from async_db_client import AsyncDBConnection
+from config import Config
+import metrics
+from repositories.trip_repository import (
+    DAILY_ROLLUPS_QUERY, LATEST_ROUTE_TRIPS_QUERY, LATEST_TRIP_LOCAL_EPOCHS_QUERY, ROLLUP_PERIODS_QUERY,
+    ROLLUP_WATERMARK_QUERY, ROUTES_QUERY, build_aggregates_query, local_days_params, to_route, to_route_trip
+)
+
+class AsyncTripRepository:
+    def __init__(self, config: Config = Config()):
+        self.db = AsyncDBConnection(config)
+
+    async def get_routes(self) -> List[Dict[str, Any]]:
+        async with self.db.cursor() as cur:
+            with metrics.db_query("routes") as q:
+                await cur.execute(ROUTES_QUERY)
+                rows = q.fetched(await cur.fetchall())
+        return [to_route(r) for r in rows]
+
+    async def iter_latest_trips(
+        self, route_ids: List[str], start_date: date, end_date: date, tz: str, batch_size: int
+    ) -> AsyncIterator[List[Dict[str, Any]]]:
+        async with self.db.cursor(name="latest_trips_stream") as cur:
+            cur.itersize = batch_size
+            with metrics.db_query("latest_route_trips"):
+                await cur.execute(LATEST_ROUTE_TRIPS_QUERY, (route_ids, *local_days_params(start_date, end_date, tz)))
+            while True:
+                with metrics.db_query("latest_route_trips") as q:
+                    rows = q.fetched(await cur.fetchmany(batch_size))
+                if not rows:
+                    break
+                yield [to_route_trip(r) for r in rows]
+
+    async def get_latest_trip_local_epochs(
+        self, route_ids: List[str], start_date: date, end_date: date, tz: str
+    ) -> List[Tuple[str, float | None, float | None]]:
+        async with self.db.cursor() as cur:
+            with metrics.db_query("latest_trip_local_epochs") as q:
+                await cur.execute(
+                    LATEST_TRIP_LOCAL_EPOCHS_QUERY, (tz, tz, route_ids, *local_days_params(start_date, end_date, tz))
+                )
+                return q.fetched(await cur.fetchall())
+
+    async def get_trip_aggregates(
+        self, route_ids: List[str], start_date: date, end_date: date, tz: str,
+        period_bounds: Sequence[Tuple[time, str]], last_period: str, sketch_alpha: float
+    ) -> List[Tuple[Any, ...]]:
+        query, period_params = build_aggregates_query(period_bounds, last_period, sketch_alpha)
+        async with self.db.cursor() as cur:
+            with metrics.db_query("trip_aggregates") as q:
+                await cur.execute(
+                    query, (tz, tz, route_ids, *local_days_params(start_date, end_date, tz), *period_params)
+                )
+                return q.fetched(await cur.fetchall())
+
+    async def get_rollup_periods(self, local_times: List[time]) -> List[Tuple[time, str]]:
+        async with self.db.cursor() as cur:
+            with metrics.db_query("rollup_periods") as q:
+                await cur.execute(ROLLUP_PERIODS_QUERY, (local_times,))
+                return q.fetched(await cur.fetchall())
+
+    async def get_daily_rollups(
+        self, route_ids: List[str], start_date: date, end_date: date
+    ) -> Tuple[Optional[date], List[Tuple[Any, ...]]]:
+        async with self.db.cursor() as cur:
+            with metrics.db_query("rollup_watermark"):
+                await cur.execute(ROLLUP_WATERMARK_QUERY)
+                row = await cur.fetchone()
+            rolled_through = min(row[0], end_date) if row else None
+            if rolled_through is None or rolled_through < start_date:
+                return None, []
+            with metrics.db_query("daily_rollups") as q:
+                await cur.execute(DAILY_ROLLUPS_QUERY, (route_ids, start_date, rolled_through))
+                return rolled_through, q.fetched(await cur.fetchall())
@@ -1,37 +1,176 @@
-from typing import List
-from datetime import date
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+from datetime import date, time
 from db_client import DBConnection
 from config import Config
+import metrics
+
+ROUTES_QUERY = """
+    SELECT route_id, first_seen, last_seen, trip_count, observation_count
+    FROM routes
+    ORDER BY route_id;
+"""
+
+# Days start at local midnight, the same cut refresh_trip_stats_daily uses for the rollups.
+LOCAL_DAYS_FILTER = """
+      AND start_time >= %s::timestamp AT TIME ZONE %s
+      AND start_time < (%s::date + 1)::timestamp AT TIME ZONE %s"""
+
+LATEST_ROUTE_TRIPS_QUERY = f"""
+    SELECT route_id, trip_id, start_time, end_time, collected_at
+    FROM trip_latest
+    WHERE route_id = ANY(%s){LOCAL_DAYS_FILTER};
+"""
+
+LATEST_TRIP_LOCAL_EPOCHS_QUERY = f"""
+    SELECT route_id,
+           EXTRACT(EPOCH FROM start_time AT TIME ZONE %s)::float8,
+           EXTRACT(EPOCH FROM end_time AT TIME ZONE %s)::float8
+    FROM trip_latest
+    WHERE route_id = ANY(%s){LOCAL_DAYS_FILTER};
+"""
+
+ROLLUP_WATERMARK_QUERY = """
+    SELECT rolled_through
+    FROM trip_stats_watermark;
+"""
+
+DAILY_ROLLUPS_QUERY = """
+    SELECT route_id, local_date, period, total_minutes, trip_count, duration_sketch
+    FROM trip_stats_daily
+    WHERE route_id = ANY(%s)
+      AND local_date BETWEEN %s AND %s
+    ORDER BY route_id, local_date;
+"""
+
+ROLLUP_PERIODS_QUERY = """
+    SELECT local_time, classify_trip_period(local_time)
+    FROM unnest(%s::time[]) AS local_time;
+"""
+
+def build_aggregates_query(
+    period_bounds: Sequence[Tuple[time, str]], last_period: str, sketch_alpha: float
+) -> Tuple[str, List[Any]]:
+    cases = " ".join("WHEN start_local::time < %s THEN %s" for _ in period_bounds)
+    params: List[Any] = [value for bound, name in period_bounds for value in (bound, name)]
+    params.extend([last_period, sketch_alpha, sketch_alpha, sketch_alpha])
+    query = f"""
+        WITH local_times AS (
+            SELECT route_id,
+                   start_time AT TIME ZONE %s AS start_local,
+                   end_time AT TIME ZONE %s AS end_local
+            FROM trip_latest
+            WHERE route_id = ANY(%s){LOCAL_DAYS_FILTER}
+        ),
+        local_trips AS (
+            SELECT route_id,
+                   start_local,
+                   EXTRACT(EPOCH FROM end_local - start_local)::float8 / 60.0 AS duration_min,
+                   COALESCE(end_local > start_local, FALSE) AS valid
+            FROM local_times
+        ),
+        binned_trips AS (
+            SELECT route_id,
+                   CASE WHEN valid THEN start_local::date END AS trip_day,
+                   CASE WHEN NOT valid THEN NULL {cases} ELSE %s END AS period,
+                   CASE WHEN valid THEN CEIL(LN(duration_min) / LN((1 + %s) / (1 - %s)))::integer END AS bin,
+                   SUM(duration_min) FILTER (WHERE valid) AS bin_total,
+                   COUNT(*) AS bin_count
+            FROM local_trips
+            GROUP BY 1, 2, 3, 4
+        )
+        SELECT route_id,
+               trip_day,
+               period,
+               SUM(bin_total) AS total_minutes,
+               SUM(bin_count) AS trip_count,
+               jsonb_build_object(
+                   'alpha', %s::float8,
+                   'bins', jsonb_object_agg(bin, bin_count) FILTER (WHERE bin IS NOT NULL)
+               ) AS duration_sketch
+        FROM binned_trips
+        GROUP BY 1, 2, 3
+        ORDER BY 1, 2;
+    """
+    return query, params
+
+def local_days_params(start_date: date, end_date: date, tz: str) -> Tuple[Any, ...]:
+    return (start_date, tz, end_date, tz)
+
+def to_route(row: Sequence[Any]) -> Dict[str, Any]:
+    return {
+        "route_id": row[0], "first_seen": row[1], "last_seen": row[2],
+        "trip_count": row[3], "observation_count": row[4]
+    }
+
+def to_trip(row: Sequence[Any]) -> Dict[str, Any]:
+    return {"trip_id": row[0], "start_time": row[1], "end_time": row[2], "collected_at": row[3]}
+
+def to_route_trip(row: Sequence[Any]) -> Dict[str, Any]:
+    return {"route_id": row[0], **to_trip(row[1:])}
 
 class TripRepository:
     def __init__(self, config: Config = Config()):
         self.db = DBConnection(config)
 
-    def get_routes(self) -> List[str]:
-        query = """
-            SELECT DISTINCT route_id
-            FROM trips;
-        """
+    def get_routes(self) -> List[Dict[str, Any]]:
         with self.db.cursor() as cur:
-            cur.execute(query)
-            rows = cur.fetchall()
-        return [r[0] for r in rows]
-
-    def get_latest_trips(self, route_id: str, start_date: date, end_date: date):
-        query = """
-            SELECT DISTINCT ON (trip_id) 
-                trip_id, start_time, end_time, collected_at
-            FROM trips
-            WHERE route_id = %s
-              AND start_time >= %s
-              AND start_time < %s + interval '1 day'
-            ORDER BY trip_id, collected_at DESC;
-        """
+            with metrics.db_query("routes") as q:
+                cur.execute(ROUTES_QUERY)
+                rows = q.fetched(cur.fetchall())
+        return [to_route(r) for r in rows]
+
+    def iter_latest_trips(
+        self, route_ids: List[str], start_date: date, end_date: date, tz: str, batch_size: int
+    ) -> Iterator[List[Dict[str, Any]]]:
+        with self.db.cursor(name="latest_trips_stream") as cur:
+            cur.itersize = batch_size
+            with metrics.db_query("latest_route_trips"):
+                cur.execute(LATEST_ROUTE_TRIPS_QUERY, (route_ids, *local_days_params(start_date, end_date, tz)))
+            while True:
+                with metrics.db_query("latest_route_trips") as q:
+                    rows = q.fetched(cur.fetchmany(batch_size))
+                if not rows:
+                    break
+                yield [to_route_trip(r) for r in rows]
+
+    def get_latest_trip_local_epochs(
+        self, route_ids: List[str], start_date: date, end_date: date, tz: str
+    ) -> List[Tuple[str, float | None, float | None]]:
         with self.db.cursor() as cur:
-            cur.execute(query, (route_id, start_date, end_date))
-            rows = cur.fetchall()
+            with metrics.db_query("latest_trip_local_epochs") as q:
+                cur.execute(
+                    LATEST_TRIP_LOCAL_EPOCHS_QUERY, (tz, tz, route_ids, *local_days_params(start_date, end_date, tz))
+                )
+                return q.fetched(cur.fetchall())
 
-        return [
-            {"trip_id": r[0], "start_time": r[1], "end_time": r[2], "collected_at": r[3]}
-            for r in rows
-        ]
+    def get_trip_aggregates(
+        self, route_ids: List[str], start_date: date, end_date: date, tz: str,
+        period_bounds: Sequence[Tuple[time, str]], last_period: str, sketch_alpha: float
+    ) -> List[Tuple[Any, ...]]:
+        query, period_params = build_aggregates_query(period_bounds, last_period, sketch_alpha)
+        with self.db.cursor() as cur:
+            with metrics.db_query("trip_aggregates") as q:
+                cur.execute(
+                    query, (tz, tz, route_ids, *local_days_params(start_date, end_date, tz), *period_params)
+                )
+                return q.fetched(cur.fetchall())
+
+    def get_rollup_periods(self, local_times: List[time]) -> List[Tuple[time, str]]:
+        with self.db.cursor() as cur:
+            with metrics.db_query("rollup_periods") as q:
+                cur.execute(ROLLUP_PERIODS_QUERY, (local_times,))
+                return q.fetched(cur.fetchall())
+
+    def get_daily_rollups(
+        self, route_ids: List[str], start_date: date, end_date: date
+    ) -> Tuple[Optional[date], List[Tuple[Any, ...]]]:
+        with self.db.cursor() as cur:
+            with metrics.db_query("rollup_watermark"):
+                cur.execute(ROLLUP_WATERMARK_QUERY)
+                row = cur.fetchone()
+            rolled_through = min(row[0], end_date) if row else None
+            if rolled_through is None or rolled_through < start_date:
+                return None, []
+            with metrics.db_query("daily_rollups") as q:
+                cur.execute(DAILY_ROLLUPS_QUERY, (route_ids, start_date, rolled_through))
+                return rolled_through, q.fetched(cur.fetchall())
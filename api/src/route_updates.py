@@ -0,0 +1,54 @@
+import asyncio
+import threading
+from typing import AsyncIterator, Iterable, List, Optional, Set, Tuple
+
+RESET = None
+
+class RouteUpdateBroadcaster:
+    def __init__(self, max_pending: int = 64):
+        self.max_pending = max_pending
+        self._subscribers: Set[Tuple[asyncio.AbstractEventLoop, asyncio.Queue]] = set()
+        self._lock = threading.Lock()
+
+    def publish(self, route_ids: Optional[Iterable[str]]) -> None:
+        update = RESET if route_ids is None else frozenset(route_ids)
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(self._offer, queue, update)
+            except RuntimeError:
+                # The subscriber's loop is already closed.
+                pass
+
+    def _offer(self, queue: asyncio.Queue, update: Optional[frozenset]) -> None:
+        if queue.full():
+            # A subscriber that fell behind is told to resync everything instead.
+            while not queue.empty():
+                queue.get_nowait()
+            update = RESET
+        queue.put_nowait(update)
+
+    async def stream(self, heartbeat_seconds: float) -> AsyncIterator[str]:
+        subscriber = (asyncio.get_running_loop(), asyncio.Queue(maxsize=self.max_pending))
+        with self._lock:
+            self._subscribers.add(subscriber)
+        try:
+            yield "retry: 5000\n\n"
+            while True:
+                try:
+                    update = await asyncio.wait_for(subscriber[1].get(), heartbeat_seconds)
+                except asyncio.TimeoutError:
+                    yield ": ping\n\n"
+                    continue
+                yield self._format(update)
+        finally:
+            with self._lock:
+                self._subscribers.discard(subscriber)
+
+    @staticmethod
+    def _format(update: Optional[frozenset]) -> str:
+        if update is RESET:
+            return "event: reset\ndata: \n\n"
+        route_ids: List[str] = sorted(update)
+        return f"event: trips_updated\ndata: {','.join(route_ids)}\n\n"
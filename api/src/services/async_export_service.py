@@ -0,0 +1,22 @@
+from datetime import date
+from typing import AsyncIterator
+
+from repositories.async_trip_repository import AsyncTripRepository
+from services.export_service import TripExportEncoder
+from config import Config
+
+class AsyncTripExportService:
+    def __init__(self, repo: AsyncTripRepository, config: Config | None = None):
+        self.config = config or Config()
+        self.repo = repo
+
+    async def stream(
+        self, encoder: TripExportEncoder, route_id: str, start_date: date, end_date: date
+    ) -> AsyncIterator[bytes]:
+        yield encoder.header()
+        batches = self.repo.iter_latest_trips(
+            [route_id], start_date, end_date, self.config.TZ, self.config.API_CURSOR_BATCH_SIZE
+        )
+        async for trips in batches:
+            yield encoder.encode(trips)
+        yield encoder.footer()
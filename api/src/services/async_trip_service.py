@@ -0,0 +1,71 @@
+import asyncio
+from datetime import date
+from typing import Any, Dict, List, Tuple
+
+from repositories.async_trip_repository import AsyncTripRepository
+from services.trip_service import BaseTripService
+from cache import RouteCatalogCache, StatisticsCache
+from sketch import RELATIVE_ACCURACY
+from config import Config
+
+class AsyncTripService(BaseTripService):
+    def __init__(
+        self, repo: AsyncTripRepository | None = None, config: Config | None = None,
+        cache: StatisticsCache | None = None, route_cache: RouteCatalogCache | None = None
+    ):
+        super().__init__(config, cache, route_cache)
+        self.repo = repo or AsyncTripRepository()
+
+    async def check_rollup_periods(self) -> None:
+        if self._uses_rollups():
+            self._check_rollup_periods(await self.repo.get_rollup_periods(self._rollup_period_probes()))
+
+    async def list_routes(self) -> List[str]:
+        return [r["route_id"] for r in await self.get_route_catalog()]
+
+    async def get_route_catalog(self) -> List[Dict[str, Any]]:
+        routes = self.route_cache.get() if self.route_cache is not None else None
+        if routes is None:
+            routes = await self.repo.get_routes()
+            if self.route_cache is not None:
+                self.route_cache.put(routes)
+        return routes
+
+    async def get_trip_statistics(self, route_id: str, start_date: date, end_date: date) -> Dict[str, Any]:
+        return (await self.get_trip_statistics_batch([route_id], start_date, end_date))[route_id]
+
+    async def get_trip_statistics_batch(
+        self, route_ids: List[str], start_date: date, end_date: date
+    ) -> Dict[str, Dict[str, Any]]:
+        results, missing = self._cached_statistics(route_ids, start_date, end_date)
+        if missing:
+            results.update(self._store_statistics(
+                start_date, end_date, await self._compute_trip_statistics(missing, start_date, end_date)
+            ))
+        return {route_id: results[route_id] for route_id in dict.fromkeys(route_ids)}
+
+    async def _compute_trip_statistics(
+        self, route_ids: List[str], start_date: date, end_date: date
+    ) -> Dict[str, Dict[str, Any]]:
+        # Aggregation is CPU bound; it runs in a worker thread so the event loop keeps serving other requests.
+        if self.config.STATS_ENGINE == "sql":
+            rolled_through, rows = (None, [])
+            if self.config.STATS_USE_ROLLUPS:
+                rolled_through, rows = await self.repo.get_daily_rollups(route_ids, start_date, end_date)
+            live_start = self._live_start(rolled_through, start_date)
+            if live_start <= end_date:
+                rows = rows + await self.repo.get_trip_aggregates(
+                    route_ids, live_start, end_date, self.config.TZ, self.PERIOD_BOUNDS, self.LAST_PERIOD,
+                    RELATIVE_ACCURACY
+                )
+        elif self.config.STATS_ENGINE == "numpy":
+            rows = await self.repo.get_latest_trip_local_epochs(route_ids, start_date, end_date, self.config.TZ)
+        else:
+            totals: Dict[Tuple[Any, ...], List[Any]] = {}
+            batches = self.repo.iter_latest_trips(
+                route_ids, start_date, end_date, self.config.TZ, self.config.API_CURSOR_BATCH_SIZE
+            )
+            async for trips in batches:
+                await asyncio.to_thread(self._add_trips, totals, trips)
+            rows = self._totals_to_rows(totals)
+        return await asyncio.to_thread(self._build_batch, route_ids, start_date, end_date, rows)
@@ -0,0 +1,96 @@
+import csv
+import io
+import json
+from datetime import date, datetime
+from typing import Any, Dict, Iterator, List
+import pyarrow as pa
+
+from repositories.trip_repository import TripRepository
+from config import Config
+
+EXPORT_COLUMNS = ["route_id", "trip_id", "start_time", "end_time", "collected_at"]
+
+class _ChunkSink(io.RawIOBase):
+    def __init__(self):
+        self.chunks: List[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks.clear()
+        return data
+
+class TripExportEncoder:
+    MEDIA_TYPES = {
+        "ndjson": "application/x-ndjson",
+        "csv": "text/csv",
+        "arrow": "application/vnd.apache.arrow.stream",
+    }
+    ARROW_SCHEMA = pa.schema([
+        ("route_id", pa.string()),
+        ("trip_id", pa.string()),
+        ("start_time", pa.timestamp("us", tz="UTC")),
+        ("end_time", pa.timestamp("us", tz="UTC")),
+        ("collected_at", pa.timestamp("us", tz="UTC")),
+    ])
+
+    def __init__(self, fmt: str):
+        if fmt not in self.MEDIA_TYPES:
+            raise ValueError(f"Unsupported export format: {fmt}")
+        self.fmt = fmt
+        self.media_type = self.MEDIA_TYPES[fmt]
+        self._sink = _ChunkSink()
+        self._arrow_writer = None
+
+    def header(self) -> bytes:
+        if self.fmt == "csv":
+            return (",".join(EXPORT_COLUMNS) + "\r\n").encode()
+        if self.fmt == "arrow":
+            self._arrow_writer = pa.ipc.new_stream(self._sink, self.ARROW_SCHEMA)
+            return self._sink.drain()
+        return b""
+
+    def encode(self, trips: List[Dict[str, Any]]) -> bytes:
+        if self.fmt == "ndjson":
+            return "".join(json.dumps(t, default=lambda v: v.isoformat()) + "\n" for t in trips).encode()
+        if self.fmt == "csv":
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            for t in trips:
+                writer.writerow([self._csv_value(t[c]) for c in EXPORT_COLUMNS])
+            return buffer.getvalue().encode()
+        batch = pa.RecordBatch.from_pylist(trips, schema=self.ARROW_SCHEMA)
+        self._arrow_writer.write_batch(batch)
+        return self._sink.drain()
+
+    @staticmethod
+    def _csv_value(value: Any) -> Any:
+        if value is None:
+            return ""
+        return value.isoformat() if isinstance(value, datetime) else value
+
+    def footer(self) -> bytes:
+        if self.fmt == "arrow":
+            self._arrow_writer.close()
+            return self._sink.drain()
+        return b""
+
+class TripExportService:
+    def __init__(self, repo: TripRepository, config: Config | None = None):
+        self.config = config or Config()
+        self.repo = repo
+
+    def stream(self, encoder: TripExportEncoder, route_id: str, start_date: date, end_date: date) -> Iterator[bytes]:
+        yield encoder.header()
+        batches = self.repo.iter_latest_trips(
+            [route_id], start_date, end_date, self.config.TZ, self.config.API_CURSOR_BATCH_SIZE
+        )
+        for trips in batches:
+            yield encoder.encode(trips)
+        yield encoder.footer()
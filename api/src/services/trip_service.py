@@ -1,89 +1,299 @@
-from datetime import date, time
-from statistics import mean
-from typing import Dict, Any, List
+import math
+from datetime import date, datetime, time, timedelta
+from typing import Dict, Any, Iterable, List, Sequence, Tuple
 from zoneinfo import ZoneInfo
+import numpy as np
 
 from repositories.trip_repository import TripRepository
+from cache import RouteCatalogCache, StatisticsCache
+from sketch import DurationSketch, RELATIVE_ACCURACY
 from config import Config
+import metrics
 
-class TripService:
+class BaseTripService:
     PERIODS_ORDER = ["morning", "peak (morning)", "daytime", "peak (afternoon)", "afternoon"]
+    PERIOD_BOUNDS = [
+        (time(7, 0), "morning"),
+        (time(10, 0), "peak (morning)"),
+        (time(15, 0), "daytime"),
+        (time(18, 0), "peak (afternoon)"),
+    ]
+    LAST_PERIOD = "afternoon"
+    EPOCH_DATE = date(1970, 1, 1)
+    SECONDS_PER_DAY = 86400
 
-    def __init__(self, repo: TripRepository | None = None, config: Config | None = None):
+    def __init__(
+        self, config: Config | None = None, cache: StatisticsCache | None = None,
+        route_cache: RouteCatalogCache | None = None
+    ):
         self.config = config or Config()
         self.tz = ZoneInfo(self.config.TZ)
-        self.repo = repo or TripRepository()
+        self.cache = cache
+        self.route_cache = route_cache
 
-    def list_routes(self) -> List[str]:
-        return self.repo.get_routes()
+    def _cached_statistics(
+        self, route_ids: List[str], start_date: date, end_date: date
+    ) -> Tuple[Dict[str, Dict[str, Any]], List[str]]:
+        results: Dict[str, Dict[str, Any]] = {}
+        missing: List[str] = []
+        for route_id in dict.fromkeys(route_ids):
+            cached = self.cache.get((route_id, start_date, end_date)) if self.cache is not None else None
+            if cached is None:
+                missing.append(route_id)
+            else:
+                results[route_id] = cached
+        return results, missing
 
-    def get_trip_statistics(self, route_id: str, start_date: date, end_date: date) -> Dict[str, Any]:
-        trips = self.repo.get_latest_trips(route_id, start_date, end_date)
-        if not trips:
+    def _store_statistics(
+        self, start_date: date, end_date: date, results: Dict[str, Dict[str, Any]]
+    ) -> Dict[str, Dict[str, Any]]:
+        if self.cache is not None:
+            for route_id, result in results.items():
+                self.cache.put((route_id, start_date, end_date), result)
+        return results
+
+    def _build_batch(
+        self, route_ids: List[str], start_date: date, end_date: date, rows: Sequence[Any]
+    ) -> Dict[str, Dict[str, Any]]:
+        if self.config.STATS_ENGINE == "numpy":
+            build = self._build_statistics_columnar
+        else:
+            build = self._build_statistics_from_aggregates
+        with metrics.aggregation(self.config.STATS_ENGINE):
+            grouped: Dict[str, List[Any]] = {route_id: [] for route_id in route_ids}
+            for row in rows:
+                grouped[row[0]].append(row[1:])
             return {
-                "route_id": route_id,
-                "interval": {"start_date": start_date.isoformat(), "end_date": end_date.isoformat()},
-                "overall_avg_minutes": None,
-                "days": []
+                route_id: build(route_id, start_date, end_date, route_rows)
+                for route_id, route_rows in grouped.items()
             }
 
-        by_day: Dict[date, Dict[str, Any]] = {}
-        all_durations: List[float] = []
+    def _empty_statistics(self, route_id: str, start_date: date, end_date: date) -> Dict[str, Any]:
+        return {
+            "route_id": route_id,
+            "interval": {"start_date": start_date.isoformat(), "end_date": end_date.isoformat()},
+            "overall_avg_minutes": None,
+            "days": []
+        }
 
-        for t in trips:
-            if not t["start_time"] or not t["end_time"]:
-                continue
+    def _build_statistics_from_aggregates(
+        self, route_id: str, start_date: date, end_date: date, rows: Sequence[Tuple[Any, ...]]
+    ) -> Dict[str, Any]:
+        if not rows:
+            return self._empty_statistics(route_id, start_date, end_date)
 
-            start_local = t["start_time"].astimezone(self.tz)
-            end_local = t["end_time"].astimezone(self.tz)
-            if end_local <= start_local:
+        by_day: Dict[date, Dict[str, Tuple[float, int, DurationSketch | None]]] = {}
+        for trip_day, period, total_minutes, trip_count, duration_sketch in rows:
+            if period is None:
                 continue
-
-            duration_min = (end_local - start_local).total_seconds() / 60.0
-            trip_day = start_local.date()
-            day_name = start_local.strftime("%A")
-            period = self._classify_period(start_local.time())
-
-            if trip_day not in by_day:
-                by_day[trip_day] = {
-                    "durations": [],
-                    "periods": {p: [] for p in self.PERIODS_ORDER},
-                    "day_name": day_name
-                }
-
-            by_day[trip_day]["durations"].append(duration_min)
-            by_day[trip_day]["periods"][period].append(duration_min)
-            all_durations.append(duration_min)
+            if isinstance(duration_sketch, dict):
+                duration_sketch = DurationSketch.from_json(duration_sketch)
+            by_day.setdefault(trip_day, {})[period] = (float(total_minutes), int(trip_count), duration_sketch)
 
         days_out = []
+        overall_total, overall_count = 0.0, 0
+        overall_sketch = DurationSketch()
         for d in sorted(by_day.keys()):
-            bucket = by_day[d]
-            periods_avg = {p: round(mean(vals), 2) for p, vals in bucket["periods"].items() if vals}
-            day_avg = round(mean(bucket["durations"]), 2) if bucket["durations"] else None
+            periods = by_day[d]
+            day_total = sum(total for total, _, _ in periods.values())
+            day_count = sum(count for _, count, _ in periods.values())
+            day_sketch = DurationSketch.merged(sketch for _, _, sketch in periods.values())
             days_out.append({
                 "date": d.isoformat(),
-                "day": bucket["day_name"],
-                "avg_minutes": day_avg,
-                "periods": periods_avg
+                "day": d.strftime("%A"),
+                "avg_minutes": round(day_total / day_count, 2),
+                "periods": {
+                    p: round(periods[p][0] / periods[p][1], 2)
+                    for p in self.PERIODS_ORDER if p in periods
+                },
+                "percentiles_minutes": day_sketch.percentiles(),
+                "period_percentiles_minutes": {
+                    p: periods[p][2].percentiles()
+                    for p in self.PERIODS_ORDER if p in periods and periods[p][2] is not None
+                }
             })
-
-        overall_avg = round(mean(all_durations), 2) if all_durations else None
+            overall_total += day_total
+            overall_count += day_count
+            overall_sketch.merge(day_sketch)
 
         return {
             "route_id": route_id,
             "interval": {"start_date": start_date.isoformat(), "end_date": end_date.isoformat()},
-            "avg_minutes": overall_avg,
+            "avg_minutes": round(overall_total / overall_count, 2) if overall_count else None,
+            "percentiles_minutes": overall_sketch.percentiles(),
             "days": days_out
         }
 
+    def _build_statistics_columnar(
+        self, route_id: str, start_date: date, end_date: date, rows: Sequence[Tuple[float | None, float | None]]
+    ) -> Dict[str, Any]:
+        if not rows:
+            return self._empty_statistics(route_id, start_date, end_date)
+
+        epochs = np.array(rows, dtype=np.float64).reshape(-1, 2)
+        starts, ends = epochs[:, 0], epochs[:, 1]
+        valid = ends > starts
+        starts, ends = starts[valid], ends[valid]
+
+        durations = (ends - starts) / 60.0
+        day_offsets = np.floor_divide(starts, self.SECONDS_PER_DAY).astype(np.int64)
+        seconds_of_day = starts - day_offsets * self.SECONDS_PER_DAY
+        bound_seconds = [b.hour * 3600 + b.minute * 60 + b.second for b, _ in self.PERIOD_BOUNDS]
+        period_index = np.searchsorted(bound_seconds, seconds_of_day, side="right")
+        period_names = [name for _, name in self.PERIOD_BOUNDS] + [self.LAST_PERIOD]
+
+        day_keys, day_index = np.unique(day_offsets, return_inverse=True)
+        groups = day_index * len(period_names) + period_index
+        size = len(day_keys) * len(period_names)
+        sums = np.bincount(groups, weights=durations, minlength=size)
+        counts = np.bincount(groups, minlength=size)
+
+        sketches: Dict[int, DurationSketch] = {}
+        template = DurationSketch()
+        bins = np.ceil(np.log(durations) / math.log(template.gamma)).astype(np.int64)
+        if len(bins):
+            # One int64 key per (group, bin) pair: a 1-D unique sorts far faster than unique over rows.
+            first_bin = int(bins.min())
+            span = int(bins.max()) - first_bin + 1
+            keys, key_counts = np.unique(groups * span + (bins - first_bin), return_counts=True)
+            for key, count in zip(keys.tolist(), key_counts.tolist()):
+                group, k = divmod(key, span)
+                sketches.setdefault(group, DurationSketch()).bins[k + first_bin] = count
+
+        aggregate_rows: List[Tuple[Any, ...]] = [
+            (
+                self.EPOCH_DATE + timedelta(days=int(day_keys[group // len(period_names)])),
+                period_names[group % len(period_names)],
+                float(sums[group]),
+                int(counts[group]),
+                sketches[group],
+            )
+            for group in np.flatnonzero(counts).tolist()
+        ]
+        invalid = int(len(valid) - valid.sum())
+        if invalid:
+            aggregate_rows.append((None, None, None, invalid, None))
+        return self._build_statistics_from_aggregates(route_id, start_date, end_date, aggregate_rows)
+
+    def _build_statistics(
+        self, route_id: str, start_date: date, end_date: date, trips: Iterable[Dict[str, Any]]
+    ) -> Dict[str, Any]:
+        totals: Dict[Tuple[Any, ...], List[Any]] = {}
+        for t in trips:
+            self._add_trip(totals, route_id, t)
+        rows = [row[1:] for row in self._totals_to_rows(totals)]
+        return self._build_statistics_from_aggregates(route_id, start_date, end_date, rows)
+
+    def _rollup_period_probes(self) -> List[time]:
+        probes = [time(hour, minute) for hour in range(24) for minute in range(60)]
+        for bound, _ in self.PERIOD_BOUNDS:
+            probes.append((datetime.combine(self.EPOCH_DATE, bound) - timedelta(microseconds=1)).time())
+            probes.append(bound)
+        return probes
+
+    def _check_rollup_periods(self, labels: Sequence[Tuple[time, str]]) -> None:
+        for local_time, period in labels:
+            expected = self._classify_period(local_time)
+            if period != expected:
+                raise RuntimeError(
+                    f"classify_trip_period puts {local_time} in {period!r} but PERIOD_BOUNDS put it in {expected!r}; "
+                    "update it in bkk-db/postgres/init.sql and rebuild the rollups, or set STATS_USE_ROLLUPS=false"
+                )
+
+    def _uses_rollups(self) -> bool:
+        return self.config.STATS_ENGINE == "sql" and self.config.STATS_USE_ROLLUPS
+
+    def _live_start(self, rolled_through: date | None, start_date: date) -> date:
+        return rolled_through + timedelta(days=1) if rolled_through else start_date
+
+    def _add_trips(self, totals: Dict[Tuple[Any, ...], List[Any]], trips: Iterable[Dict[str, Any]]) -> None:
+        with metrics.aggregation("python_stream"):
+            for t in trips:
+                self._add_trip(totals, t["route_id"], t)
+
+    def _add_trip(self, totals: Dict[Tuple[Any, ...], List[Any]], route_id: str, t: Dict[str, Any]) -> None:
+        key: Tuple[Any, ...] = (route_id, None, None)
+        duration_min = 0.0
+        if t["start_time"] and t["end_time"]:
+            start_local = t["start_time"].astimezone(self.tz)
+            end_local = t["end_time"].astimezone(self.tz)
+            if end_local > start_local:
+                duration_min = (end_local - start_local).total_seconds() / 60.0
+                key = (route_id, start_local.date(), self._classify_period(start_local.time()))
+
+        entry = totals.setdefault(key, [0.0, 0, DurationSketch()])
+        entry[0] += duration_min
+        entry[1] += 1
+        if duration_min > 0:
+            entry[2].add(duration_min)
+
+    @staticmethod
+    def _totals_to_rows(totals: Dict[Tuple[Any, ...], List[Any]]) -> List[Tuple[Any, ...]]:
+        return [(*key, total, count, sketch) for key, (total, count, sketch) in totals.items()]
+
     def _classify_period(self, t: time) -> str:
-        if t < time(7, 0):
-            return "morning"
-        elif t < time(10, 0):
-            return "peak (morning)"
-        elif t < time(15, 0):
-            return "daytime"
-        elif t < time(18, 0):
-            return "peak (afternoon)"
+        for bound, period in self.PERIOD_BOUNDS:
+            if t < bound:
+                return period
+        return self.LAST_PERIOD
+
+class TripService(BaseTripService):
+    def __init__(
+        self, repo: TripRepository | None = None, config: Config | None = None, cache: StatisticsCache | None = None,
+        route_cache: RouteCatalogCache | None = None
+    ):
+        super().__init__(config, cache, route_cache)
+        self.repo = repo or TripRepository()
+
+    def check_rollup_periods(self) -> None:
+        if self._uses_rollups():
+            self._check_rollup_periods(self.repo.get_rollup_periods(self._rollup_period_probes()))
+
+    def list_routes(self) -> List[str]:
+        return [r["route_id"] for r in self.get_route_catalog()]
+
+    def get_route_catalog(self) -> List[Dict[str, Any]]:
+        routes = self.route_cache.get() if self.route_cache is not None else None
+        if routes is None:
+            routes = self.repo.get_routes()
+            if self.route_cache is not None:
+                self.route_cache.put(routes)
+        return routes
+
+    def get_trip_statistics(self, route_id: str, start_date: date, end_date: date) -> Dict[str, Any]:
+        return self.get_trip_statistics_batch([route_id], start_date, end_date)[route_id]
+
+    def get_trip_statistics_batch(
+        self, route_ids: List[str], start_date: date, end_date: date
+    ) -> Dict[str, Dict[str, Any]]:
+        results, missing = self._cached_statistics(route_ids, start_date, end_date)
+        if missing:
+            results.update(self._store_statistics(
+                start_date, end_date, self._compute_trip_statistics(missing, start_date, end_date)
+            ))
+        return {route_id: results[route_id] for route_id in dict.fromkeys(route_ids)}
+
+    def _compute_trip_statistics(
+        self, route_ids: List[str], start_date: date, end_date: date
+    ) -> Dict[str, Dict[str, Any]]:
+        if self.config.STATS_ENGINE == "sql":
+            rolled_through, rows = (None, [])
+            if self.config.STATS_USE_ROLLUPS:
+                rolled_through, rows = self.repo.get_daily_rollups(route_ids, start_date, end_date)
+            live_start = self._live_start(rolled_through, start_date)
+            if live_start <= end_date:
+                rows = rows + self.repo.get_trip_aggregates(
+                    route_ids, live_start, end_date, self.config.TZ, self.PERIOD_BOUNDS, self.LAST_PERIOD,
+                    RELATIVE_ACCURACY
+                )
+        elif self.config.STATS_ENGINE == "numpy":
+            rows = self.repo.get_latest_trip_local_epochs(route_ids, start_date, end_date, self.config.TZ)
         else:
-            return "afternoon"
+            totals: Dict[Tuple[Any, ...], List[Any]] = {}
+            batches = self.repo.iter_latest_trips(
+                route_ids, start_date, end_date, self.config.TZ, self.config.API_CURSOR_BATCH_SIZE
+            )
+            for trips in batches:
+                self._add_trips(totals, trips)
+            rows = self._totals_to_rows(totals)
+        return self._build_batch(route_ids, start_date, end_date, rows)
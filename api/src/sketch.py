@@ -0,0 +1,63 @@
+import math
+from typing import Any, Dict, Iterable, Optional
+
+RELATIVE_ACCURACY = 0.01
+PERCENTILES = {"p50": 0.5, "p90": 0.9, "p95": 0.95}
+
+class DurationSketch:
+    def __init__(self, alpha: float = RELATIVE_ACCURACY, bins: Optional[Dict[int, int]] = None):
+        self.alpha = alpha
+        self.gamma = (1 + alpha) / (1 - alpha)
+        self._log_gamma = math.log(self.gamma)
+        self.bins: Dict[int, int] = dict(bins or {})
+
+    @classmethod
+    def from_json(cls, data: Dict[str, Any]) -> "DurationSketch":
+        return cls(float(data["alpha"]), {int(k): int(v) for k, v in data["bins"].items()})
+
+    @classmethod
+    def merged(cls, sketches: Iterable[Optional["DurationSketch"]]) -> "DurationSketch":
+        result = cls()
+        for sketch in sketches:
+            if sketch is not None:
+                result.merge(sketch)
+        return result
+
+    def to_json(self) -> Dict[str, Any]:
+        return {"alpha": self.alpha, "bins": {str(k): v for k, v in self.bins.items()}}
+
+    def key(self, value: float) -> int:
+        return math.ceil(math.log(value) / self._log_gamma)
+
+    def add(self, value: float, count: int = 1) -> None:
+        if value <= 0:
+            raise ValueError("DurationSketch only accepts positive values")
+        k = self.key(value)
+        self.bins[k] = self.bins.get(k, 0) + count
+
+    def merge(self, other: "DurationSketch") -> None:
+        if other.alpha != self.alpha:
+            raise ValueError(f"Cannot merge sketches with accuracy {self.alpha} and {other.alpha}")
+        for k, count in other.bins.items():
+            self.bins[k] = self.bins.get(k, 0) + count
+
+    @property
+    def count(self) -> int:
+        return sum(self.bins.values())
+
+    def quantile(self, q: float) -> Optional[float]:
+        total = self.count
+        if not total:
+            return None
+        rank = q * (total - 1)
+        cumulative = 0
+        for k in sorted(self.bins):
+            cumulative += self.bins[k]
+            if cumulative > rank:
+                return 2 * self.gamma ** k / (self.gamma + 1)
+        return 2 * self.gamma ** max(self.bins) / (self.gamma + 1)
+
+    def percentiles(self) -> Optional[Dict[str, float]]:
+        if not self.bins:
+            return None
+        return {name: round(self.quantile(q), 2) for name, q in PERCENTILES.items()}
@@ -0,0 +1,19 @@
+def test_checkout_replaces_connections_killed_while_idle(api_env, monkeypatch):
+    import psycopg2
+    monkeypatch.setenv("POSTGRES_POOL_MIN", "2")
+    monkeypatch.setenv("POSTGRES_POOL_MAX", "2")
+    from config import Config
+    from db_client import DBConnection
+
+    with DBConnection(Config()) as db:
+        with db.cursor() as first, db.cursor() as second:
+            first.execute("SELECT pg_backend_pid()")
+            second.execute("SELECT pg_backend_pid()")
+            pids = [first.fetchone()[0], second.fetchone()[0]]
+
+        with psycopg2.connect(**api_env) as admin, admin.cursor() as cur:
+            cur.execute("SELECT pg_terminate_backend(pid) FROM unnest(%s::int[]) AS pid", (pids,))
+
+        with db.cursor() as cur:
+            cur.execute("SELECT pg_backend_pid()")
+            assert cur.fetchone()[0] not in pids
@@ -0,0 +1,62 @@
+import random
+import statistics
+
+import pytest
+
+from sketch import PERCENTILES, RELATIVE_ACCURACY, DurationSketch
+
+# With n - 1 divisible by 100 every checked rank is a whole sample, so the inclusive
+# quantiles are exact order statistics and the sketch guarantee applies to them directly.
+SAMPLES = 10001
+
+def uniform_durations(rnd: random.Random):
+    return [rnd.uniform(3.0, 90.0) for _ in range(SAMPLES)]
+
+def skewed_durations(rnd: random.Random):
+    # Mostly short trips with a long tail, like a route with occasional disruptions.
+    return [rnd.lognormvariate(3.0, 0.8) for _ in range(SAMPLES)]
+
+def exact_percentiles(values):
+    cuts = statistics.quantiles(values, n=100, method="inclusive")
+    return {name: cuts[round(q * 100) - 1] for name, q in PERCENTILES.items()}
+
+def assert_within_accuracy(sketch: DurationSketch, values):
+    exact = exact_percentiles(values)
+    for name, q in PERCENTILES.items():
+        estimate = sketch.quantile(q)
+        assert abs(estimate - exact[name]) <= RELATIVE_ACCURACY * exact[name] * (1 + 1e-9), (name, estimate, exact[name])
+
+@pytest.mark.parametrize("generate", [uniform_durations, skewed_durations])
+def test_added_percentiles_within_accuracy(generate):
+    values = generate(random.Random(7))
+    sketch = DurationSketch()
+    for value in values:
+        sketch.add(value)
+    assert_within_accuracy(sketch, values)
+
+@pytest.mark.parametrize("generate", [uniform_durations, skewed_durations])
+def test_merged_days_within_accuracy(generate):
+    rnd = random.Random(11)
+    values = generate(rnd)
+    days = [DurationSketch() for _ in range(7)]
+    for value in values:
+        rnd.choice(days).add(value)
+
+    merged = DurationSketch.merged(days)
+
+    assert merged.count == len(values)
+    assert_within_accuracy(merged, values)
+
+def test_merged_days_skip_missing_and_match_a_single_sketch():
+    rnd = random.Random(3)
+    values = skewed_durations(rnd)
+    single = DurationSketch()
+    first, second = DurationSketch(), DurationSketch()
+    for i, value in enumerate(values):
+        single.add(value)
+        (first if i % 2 else second).add(value)
+
+    merged = DurationSketch.merged([first, None, second])
+
+    assert merged.bins == single.bins
+    assert merged.percentiles() == single.percentiles()
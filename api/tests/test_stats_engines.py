@@ -0,0 +1,135 @@
+from datetime import date, datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+import pytest
+
+TZ = ZoneInfo("Europe/Budapest")
+START_DATE, END_DATE = date(2026, 3, 27), date(2026, 3, 31)
+
+def local(*args) -> datetime:
+    return datetime(*args, tzinfo=TZ)
+
+def trips():
+    rows = [
+        # Spring forward on 2026-03-29: 02:00 local does not exist.
+        ("dst-before", local(2026, 3, 29, 1, 30), local(2026, 3, 29, 3, 30)),
+        ("dst-after", local(2026, 3, 29, 3, 0), local(2026, 3, 29, 3, 45)),
+        # Past local midnight, and UTC midnight falling on the previous local day.
+        ("midnight", local(2026, 3, 28, 23, 40), local(2026, 3, 29, 0, 35)),
+        ("early", local(2026, 3, 30, 0, 20), local(2026, 3, 30, 0, 50)),
+        # Period bounds.
+        ("bound-7", local(2026, 3, 30, 7, 0), local(2026, 3, 30, 7, 40)),
+        ("bound-10", local(2026, 3, 30, 10, 0), local(2026, 3, 30, 10, 33)),
+        ("bound-18", local(2026, 3, 30, 18, 0), local(2026, 3, 30, 18, 51)),
+        # Invalid durations still count as trips.
+        ("negative", local(2026, 3, 30, 8, 0), local(2026, 3, 30, 7, 50)),
+        ("zero", local(2026, 3, 30, 9, 0), local(2026, 3, 30, 9, 0)),
+        ("no-end", local(2026, 3, 30, 12, 0), None),
+        # Outside the range by local day.
+        ("before", local(2026, 3, 26, 23, 30), local(2026, 3, 27, 0, 10)),
+        ("after", local(2026, 4, 1, 0, 30), local(2026, 4, 1, 1, 0)),
+    ]
+    day = local(2026, 3, 27, 5, 0)
+    for i in range(300):
+        start = day + timedelta(minutes=23 * i)
+        rows.append((f"regular-{i}", start, start + timedelta(minutes=20 + (i * 7) % 45)))
+    return [
+        ("0050", trip_id, start.astimezone(timezone.utc), end.astimezone(timezone.utc) if end else None)
+        for trip_id, start, end in rows
+    ]
+
+@pytest.fixture(scope="module")
+def seeded(database):
+    import psycopg2
+
+    with psycopg2.connect(**database) as conn, conn.cursor() as cur:
+        cur.execute("TRUNCATE trip_latest, trip_stats_daily, trip_stats_watermark")
+        cur.executemany(
+            "INSERT INTO trip_latest (route_id, trip_id, start_time, end_time, collected_at) "
+            "VALUES (%s, %s, %s, %s, NOW())",
+            trips()
+        )
+        cur.execute("SELECT rebuild_trip_stats_daily(%s, %s, %s)", (START_DATE, END_DATE, "Europe/Budapest"))
+        cur.execute(
+            "INSERT INTO trip_stats_watermark (rolled_through) VALUES (%s) "
+            "ON CONFLICT (id) DO UPDATE SET rolled_through = EXCLUDED.rolled_through",
+            (START_DATE + timedelta(days=1),)
+        )
+    return database
+
+def statistics(monkeypatch, engine: str, use_rollups: bool):
+    monkeypatch.setenv("STATS_ENGINE", engine)
+    monkeypatch.setenv("STATS_USE_ROLLUPS", "true" if use_rollups else "false")
+    from config import Config
+    from repositories.trip_repository import TripRepository
+    from services.trip_service import TripService
+
+    config = Config()
+    repo = TripRepository(config)
+    try:
+        return TripService(repo, config).get_trip_statistics("0050", START_DATE, END_DATE)
+    finally:
+        repo.db.close()
+
+@pytest.mark.parametrize("engine,use_rollups", [("sql", True), ("python", False), ("numpy", False)])
+def test_engines_match_sql(seeded, api_env, monkeypatch, engine, use_rollups):
+    expected = statistics(monkeypatch, "sql", False)
+    assert [d["date"] for d in expected["days"]] == [
+        "2026-03-27", "2026-03-28", "2026-03-29", "2026-03-30", "2026-03-31"
+    ]
+    assert statistics(monkeypatch, engine, use_rollups) == expected
+
+def async_statistics(monkeypatch, engine: str, use_rollups: bool):
+    import asyncio
+    monkeypatch.setenv("STATS_ENGINE", engine)
+    monkeypatch.setenv("STATS_USE_ROLLUPS", "true" if use_rollups else "false")
+    from config import Config
+    from repositories.async_trip_repository import AsyncTripRepository
+    from services.async_trip_service import AsyncTripService
+
+    async def run():
+        config = Config()
+        repo = AsyncTripRepository(config)
+        async with repo.db:
+            return await AsyncTripService(repo, config).get_trip_statistics("0050", START_DATE, END_DATE)
+    return asyncio.run(run())
+
+@pytest.mark.parametrize("engine,use_rollups", [("sql", True), ("sql", False), ("python", False), ("numpy", False)])
+def test_async_service_matches_sync(seeded, api_env, monkeypatch, engine, use_rollups):
+    pytest.importorskip("psycopg_pool")
+    assert async_statistics(monkeypatch, engine, use_rollups) == statistics(monkeypatch, engine, use_rollups)
+
+def test_rollup_periods_must_match_period_bounds(api_env, monkeypatch):
+    from datetime import time
+    monkeypatch.setenv("STATS_ENGINE", "sql")
+    monkeypatch.setenv("STATS_USE_ROLLUPS", "true")
+    from config import Config
+    from repositories.trip_repository import TripRepository
+    from services.trip_service import TripService
+
+    config = Config()
+    repo = TripRepository(config)
+    try:
+        service = TripService(repo, config)
+        service.check_rollup_periods()
+        monkeypatch.setattr(service, "PERIOD_BOUNDS", [(time(7, 30), "morning"), *TripService.PERIOD_BOUNDS[1:]])
+        with pytest.raises(RuntimeError, match="07:00"):
+            service.check_rollup_periods()
+    finally:
+        repo.db.close()
+
+def test_async_rollup_periods_match_period_bounds(api_env, monkeypatch):
+    import asyncio
+    pytest.importorskip("psycopg_pool")
+    monkeypatch.setenv("STATS_ENGINE", "sql")
+    monkeypatch.setenv("STATS_USE_ROLLUPS", "true")
+    from config import Config
+    from repositories.async_trip_repository import AsyncTripRepository
+    from services.async_trip_service import AsyncTripService
+
+    async def run():
+        config = Config()
+        repo = AsyncTripRepository(config)
+        async with repo.db:
+            await AsyncTripService(repo, config).check_rollup_periods()
+    asyncio.run(run())
@@ -0,0 +1,98 @@
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+os.environ.setdefault("BKK_API_KEY", "benchmark")
+for key in ("POSTGRES_USER", "POSTGRES_PASSWORD", "POSTGRES_DB"):
+    os.environ.setdefault(key, "benchmark")
+
+from config import Config
+from bkk_client import BkkClient
+from db_client import DBHandler
+from feed_recorder import RecordedFeedSource
+from trip_state import TripStateCache
+
+STAGES = ("download", "parse", "filter", "write")
+
+
+def percentile(values, q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Replay recorded TripUpdates.pb feeds through the collector pipeline as fast as possible. "
+                    "Writes go to the database configured by POSTGRES_*, use a scratch database."
+    )
+    parser.add_argument("--dir", required=True, help="Directory recorded with BKK_RECORD_DIR")
+    parser.add_argument("--routes", help="Comma separated route IDs (default: ROUTE_IDS)")
+    parser.add_argument("--all-routes", action="store_true", help="Collect every route of the first recorded feed")
+    parser.add_argument("--no-write", action="store_true", help="Skip the database write stage")
+    args = parser.parse_args()
+
+    config = Config()
+    client = BkkClient(config)
+    trip_state = TripStateCache()
+    source = RecordedFeedSource(args.dir)
+    db = None if args.no_write else DBHandler(config)
+
+    route_ids = args.routes.split(",") if args.routes else config.ROUTE_IDS
+    if args.all_routes:
+        first = source.paths()[0]
+        feed = client._parse_feed(Path(first).read_bytes())
+        route_ids = sorted({e.trip_update.trip.route_id for e in feed.entity if e.HasField("trip_update")})
+
+    timings = {stage: [] for stage in STAGES}
+    feeds = skipped = seen = written = 0
+    started = time.perf_counter()
+    stage_started = time.perf_counter()
+    for fetched_at, content in source:
+        timings["download"].append(time.perf_counter() - stage_started)
+        feeds += 1
+
+        t = time.perf_counter()
+        trips_by_route = client.tripupdates_from_feed(content, route_ids)
+        timings["parse"].append(time.perf_counter() - t)
+        if trips_by_route is None:
+            skipped += 1
+            stage_started = time.perf_counter()
+            continue
+
+        t = time.perf_counter()
+        changed = [
+            {**trip, "collected_at": fetched_at}
+            for route_id, trips in trips_by_route.items() for trip in trip_state.changed(route_id, trips)
+        ]
+        timings["filter"].append(time.perf_counter() - t)
+        seen += sum(len(trips) for trips in trips_by_route.values())
+
+        if db is not None:
+            t = time.perf_counter()
+            db.insert_trips(changed)
+            timings["write"].append(time.perf_counter() - t)
+        written += len(changed)
+        stage_started = time.perf_counter()
+    elapsed = time.perf_counter() - started
+    if db is not None:
+        db.close()
+
+    print(f"routes {len(route_ids)} | feeds {feeds} ({skipped} unchanged) | trips seen {seen} | rows written {written}")
+    print(f"elapsed {elapsed:.2f}s | {feeds / elapsed:.1f} feeds/s | {seen / elapsed:.0f} trips/s | {written / elapsed:.0f} rows/s")
+    for stage in STAGES:
+        values = timings[stage]
+        if not values:
+            continue
+        print(
+            f"{stage:>8} | total {sum(values):8.3f}s | mean {sum(values) / len(values) * 1000:8.2f} ms | "
+            f"p95 {percentile(values, 0.95) * 1000:8.2f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
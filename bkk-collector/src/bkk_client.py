@@ -1,19 +1,44 @@
 import logging
+import time
 from datetime import datetime, timezone
-from typing import List, Optional, Tuple
+from typing import Dict, Iterable, List, Optional, Tuple
 import requests
 from google.transit import gtfs_realtime_pb2
 from config import Config
+from feed_recorder import FeedRecorder
+import metrics
 
 logger = logging.getLogger(__name__)
 
 class BkkApiError(Exception):
     pass
 
+def _decode_varint(buf: bytes, pos: int) -> Tuple[int, int]:
+    result = shift = 0
+    while True:
+        b = buf[pos]
+        result |= (b & 0x7F) << shift
+        pos += 1
+        if not b & 0x80:
+            return result, pos
+        shift += 7
+
 class BkkClient:
+    FEED_HEADER_TAG = 0x0A
+
     def __init__(self, config: Config):
         self.api_url = config.BKK_API_URL
         self.api_key = config.BKK_API_KEY
+        self.session = requests.Session()
+        self.session.headers.update({
+            "Accept": "application/x-google-protobuf",
+            "User-Agent": "python-requests/3.12",
+            "Accept-Encoding": "gzip, deflate",
+        })
+        self._etag: Optional[str] = None
+        self._last_modified: Optional[str] = None
+        self._last_feed_timestamp: Optional[int] = None
+        self.recorder = FeedRecorder(config.BKK_RECORD_DIR) if config.BKK_RECORD_DIR else None
 
     def _epoch_to_dt(self, ts: Optional[int]) -> Optional[datetime]:
         if ts is None:
@@ -31,42 +56,104 @@ class BkkClient:
 
         return self._epoch_to_dt(start_ts), self._epoch_to_dt(end_ts)
 
-    def fetch_tripupdates(self, route_id: str) -> List[dict]:
-        headers = {
-            "Accept": "application/x-google-protobuf",
-            "User-Agent": "python-requests/3.12",
-            "Accept-Encoding": "identity",
-        }
+    def _download_feed(self) -> Optional[bytes]:
+        headers = {}
+        if self._etag:
+            headers["If-None-Match"] = self._etag
+        if self._last_modified:
+            headers["If-Modified-Since"] = self._last_modified
         params = {"key": self.api_key}
 
+        started = time.perf_counter()
         try:
-            resp = requests.get(self.api_url, params=params, headers=headers, timeout=20)
+            resp = self.session.get(self.api_url, params=params, headers=headers, timeout=20)
             resp.raise_for_status()
         except Exception as e:
+            metrics.FEED_REQUESTS.labels("error").inc()
             logger.error("HTTP request failed: %s", e)
             raise BkkApiError(f"HTTP request failed: {e}") from e
+        metrics.FEED_DOWNLOAD_SECONDS.observe(time.perf_counter() - started)
+        if resp.status_code == 304:
+            metrics.FEED_REQUESTS.labels("not_modified").inc()
+            metrics.FEEDS_SKIPPED.labels("not_modified").inc()
+            logger.info("Feed not modified since last poll")
+            return None
+        metrics.FEED_REQUESTS.labels("ok").inc()
+        metrics.FEED_DOWNLOAD_BYTES.inc(len(resp.content))
+        self._etag = resp.headers.get("ETag")
+        self._last_modified = resp.headers.get("Last-Modified")
+        if self.recorder is not None:
+            self.recorder.save(resp.content, datetime.now(timezone.utc))
+        logger.debug(
+            "Downloaded feed: %s bytes on the wire, %d bytes decoded",
+            resp.headers.get("Content-Length", "?"), len(resp.content)
+        )
+        return resp.content
+
+    def _peek_feed_timestamp(self, content: bytes) -> Optional[int]:
+        try:
+            if not content or content[0] != self.FEED_HEADER_TAG:
+                return None
+            length, pos = _decode_varint(content, 1)
+            header = gtfs_realtime_pb2.FeedHeader()
+            header.ParseFromString(content[pos:pos + length])
+        except Exception:
+            return None
+        return header.timestamp if header.HasField("timestamp") else None
 
+    def _parse_feed(self, content: bytes) -> gtfs_realtime_pb2.FeedMessage:
         feed = gtfs_realtime_pb2.FeedMessage()
         try:
-            feed.ParseFromString(resp.content)
+            feed.ParseFromString(content)
         except Exception as e:
             logger.error("Failed to parse protobuf: %s", e)
             raise BkkApiError(f"Protobuf parse failed: {e}") from e
+        return feed
 
-        results = []
+    def _index_by_route(self, feed: gtfs_realtime_pb2.FeedMessage, route_ids: Iterable[str]) -> Dict[str, List[dict]]:
+        results: Dict[str, List[dict]] = {route_id: [] for route_id in route_ids}
         for entity in feed.entity:
             if not entity.HasField("trip_update"):
                 continue
             tu = entity.trip_update
-            if tu.trip.route_id != route_id:
+            bucket = results.get(tu.trip.route_id)
+            if bucket is None:
                 continue
             start_dt, end_dt = self._extract_first_last_times(tu.stop_time_update)
-            results.append({
+            bucket.append({
                 "route_id": tu.trip.route_id,
                 "trip_id": tu.trip.trip_id or "",
                 "start_time": start_dt,
                 "end_time": end_dt,
             })
+        return results
+
+    def fetch_tripupdates_by_route(self, route_ids: Iterable[str]) -> Optional[Dict[str, List[dict]]]:
+        content = self._download_feed()
+        if content is None:
+            return None
+        return self.tripupdates_from_feed(content, route_ids)
+
+    def tripupdates_from_feed(self, content: bytes, route_ids: Iterable[str]) -> Optional[Dict[str, List[dict]]]:
+        feed_timestamp = self._peek_feed_timestamp(content)
+        if feed_timestamp is not None and feed_timestamp == self._last_feed_timestamp:
+            metrics.FEEDS_SKIPPED.labels("unchanged_timestamp").inc()
+            logger.info("Feed unchanged since timestamp %d, skipping", feed_timestamp)
+            return None
+
+        with metrics.FEED_PARSE_SECONDS.time():
+            feed = self._parse_feed(content)
+            results = self._index_by_route(feed, route_ids)
+        self._last_feed_timestamp = feed_timestamp
 
-        logger.info("Fetched %d trips for route %s", len(results), route_id)
+        logger.info(
+            "Fetched %d trips for %d routes",
+            sum(len(trips) for trips in results.values()), len(results)
+        )
         return results
+
+    def fetch_tripupdates(self, route_id: str) -> List[dict]:
+        return (self.fetch_tripupdates_by_route([route_id]) or {}).get(route_id, [])
+
+    def close(self) -> None:
+        self.session.close()
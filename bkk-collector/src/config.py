@@ -1,4 +1,5 @@
 import os
+import socket
 from typing import List
 
 class Config:
@@ -11,13 +12,34 @@ class Config:
 
         self.TZ: str = os.getenv("TZ", "Europe/Budapest")
 
-        self.BKK_API_KEY: str = self._get_env("BKK_API_KEY", required=True)
+        self.BKK_REPLAY_DIR: str | None = os.getenv("BKK_REPLAY_DIR") or None
+        self.BKK_REPLAY_SPEED: float = self._get_float_env("BKK_REPLAY_SPEED", 0.0)
+        self.BKK_RECORD_DIR: str | None = os.getenv("BKK_RECORD_DIR") or None
+        self.BKK_API_KEY: str = self._get_env("BKK_API_KEY", required=self.BKK_REPLAY_DIR is None)
         self.BKK_API_URL: str = os.getenv(
             "BKK_API_URL",
             "https://go.bkk.hu/api/query/v1/ws/gtfs-rt/full/TripUpdates.pb"
         )
         self.ROUTE_IDS: List[str] = os.getenv("ROUTE_IDS", "0050,0070,0090").split(",")
 
+        self.TRIPS_PARTITION_DAYS_AHEAD: int = self._get_int_env("TRIPS_PARTITION_DAYS_AHEAD", 7)
+        self.TRIPS_RETENTION_DAYS: int = self._get_int_env("TRIPS_RETENTION_DAYS", 0)
+        self.STATS_ROLLUP_LOOKBACK_DAYS: int = self._get_int_env("STATS_ROLLUP_LOOKBACK_DAYS", 1)
+
+        self.COLLECTOR_QUEUE_MAX_BATCHES: int = self._get_int_env("COLLECTOR_QUEUE_MAX_BATCHES", 60)
+        self.COLLECTOR_WRITE_BATCH_ROWS: int = self._get_int_env("COLLECTOR_WRITE_BATCH_ROWS", 50000)
+        self.COLLECTOR_WRITE_RETRY_SECONDS: int = self._get_int_env("COLLECTOR_WRITE_RETRY_SECONDS", 5)
+        self.COLLECTOR_SHARDING: bool = self._get_bool_env("COLLECTOR_SHARDING", False)
+        self.COLLECTOR_INSTANCE_ID: str = os.getenv("COLLECTOR_INSTANCE_ID", socket.gethostname())
+        self.COLLECTOR_LEASE_SECONDS: int = self._get_int_env("COLLECTOR_LEASE_SECONDS", 30)
+        self.COLLECTOR_HEARTBEAT_SECONDS: int = self._get_int_env("COLLECTOR_HEARTBEAT_SECONDS", 10)
+        self.COLLECTOR_HASH_VNODES: int = self._get_int_env("COLLECTOR_HASH_VNODES", 64)
+        self.COLLECTOR_METRICS_PORT: int = self._get_int_env("COLLECTOR_METRICS_PORT", 9100)
+        self.COLLECTOR_SPILL_PATH: str = os.getenv(
+            "COLLECTOR_SPILL_PATH",
+            f"spill/{self.COLLECTOR_INSTANCE_ID}.jsonl" if self.COLLECTOR_SHARDING else "spill/trips.jsonl"
+        )
+
     def _get_env(self, key: str, required: bool = False) -> str:
         value = os.getenv(key)
         if required and not value:
@@ -29,3 +51,19 @@ class Config:
             return int(os.getenv(key, str(default)))
         except ValueError:
             raise ValueError(f"Environment variable {key} must be an integer")
+
+    def _get_float_env(self, key: str, default: float) -> float:
+        try:
+            return float(os.getenv(key, str(default)))
+        except ValueError:
+            raise ValueError(f"Environment variable {key} must be a number")
+
+    def _get_bool_env(self, key: str, default: bool) -> bool:
+        value = os.getenv(key)
+        if value is None:
+            return default
+        if value.lower() in ("1", "true", "yes", "on"):
+            return True
+        if value.lower() in ("0", "false", "no", "off"):
+            return False
+        raise ValueError(f"Environment variable {key} must be a boolean")
@@ -1,6 +1,15 @@
+import logging
+import time
 import psycopg2
-from typing import Dict, List, Any
+from psycopg2.extras import execute_values
+from typing import Dict, List, Any, Set, Tuple
 from config import Config
+import metrics
+
+logger = logging.getLogger(__name__)
+
+TRIPS_UPDATED_CHANNEL = "trips_updated"
+NOTIFY_PAYLOAD_LIMIT = 7900
 
 class DBHandler:
     def __init__(self, config: Config):
@@ -13,23 +22,149 @@ class DBHandler:
         }
         self.conn = psycopg2.connect(**self.db_config)
 
+    def _ensure_connection(self) -> None:
+        if self.conn.closed:
+            logger.info("Reconnecting to the database")
+            self.conn = psycopg2.connect(**self.db_config)
+
     def insert_trips(self, trips: List[Dict[str, Any]]):
         if not trips:
             return
+        started = time.perf_counter()
+        self._ensure_connection()
+        try:
+            with self.conn.cursor() as cur:
+                execute_values(
+                    cur,
+                    """
+                    INSERT INTO trips (route_id, trip_id, start_time, end_time, collected_at)
+                    VALUES %s
+                    """,
+                    [(t["route_id"], t["trip_id"], t["start_time"], t["end_time"], t["collected_at"]) for t in trips],
+                    page_size=len(trips),
+                )
+                latest: Dict[Tuple[str, str], Dict[str, Any]] = {}
+                for t in trips:
+                    key = (t["route_id"], t["trip_id"])
+                    if key not in latest or latest[key]["collected_at"] <= t["collected_at"]:
+                        latest[key] = t
+                upserted = execute_values(
+                    cur,
+                    """
+                    INSERT INTO trip_latest (route_id, trip_id, start_time, end_time, collected_at)
+                    VALUES %s
+                    ON CONFLICT (route_id, trip_id) DO UPDATE
+                    SET start_time = EXCLUDED.start_time,
+                        end_time = EXCLUDED.end_time,
+                        collected_at = EXCLUDED.collected_at
+                    WHERE trip_latest.collected_at <= EXCLUDED.collected_at
+                    RETURNING route_id, (xmax = 0) AS inserted
+                    """,
+                    [
+                        (t["route_id"], t["trip_id"], t["start_time"], t["end_time"], t["collected_at"])
+                        for t in latest.values()
+                    ],
+                    page_size=len(latest),
+                    fetch=True,
+                )
+                self._upsert_routes(cur, trips, upserted)
+                self._notify_routes_updated(cur, {t["route_id"] for t in trips})
+            self.conn.commit()
+        except Exception as e:
+            metrics.INSERT_FAILURES.inc()
+            if not self.conn.closed:
+                self.conn.rollback()
+            raise e
+        elapsed = time.perf_counter() - started
+        metrics.INSERT_SECONDS.observe(elapsed)
+        metrics.INSERT_ROWS.inc(len(trips))
+        logger.info(
+            "Inserted %d rows in %.3fs (%.0f rows/s)",
+            len(trips), elapsed, len(trips) / elapsed if elapsed > 0 else float("inf")
+        )
+
+    def _upsert_routes(self, cur, trips: List[Dict[str, Any]], upserted: List[Tuple[str, bool]]) -> None:
+        seen: Dict[str, List[Any]] = {}
+        for t in trips:
+            entry = seen.setdefault(t["route_id"], [t["collected_at"], t["collected_at"], 0, 0])
+            entry[0] = min(entry[0], t["collected_at"])
+            entry[1] = max(entry[1], t["collected_at"])
+            entry[3] += 1
+        for route_id, inserted in upserted:
+            if inserted:
+                seen[route_id][2] += 1
+        execute_values(
+            cur,
+            """
+            INSERT INTO routes (route_id, first_seen, last_seen, trip_count, observation_count)
+            VALUES %s
+            ON CONFLICT (route_id) DO UPDATE
+            SET first_seen = LEAST(routes.first_seen, EXCLUDED.first_seen),
+                last_seen = GREATEST(routes.last_seen, EXCLUDED.last_seen),
+                trip_count = routes.trip_count + EXCLUDED.trip_count,
+                observation_count = routes.observation_count + EXCLUDED.observation_count
+            """,
+            [(route_id, *entry) for route_id, entry in sorted(seen.items())],
+            page_size=len(seen),
+        )
+
+    def _notify_routes_updated(self, cur, route_ids: Set[str]) -> None:
+        payload: List[str] = []
+        for route_id in sorted(route_ids):
+            if payload and len(",".join(payload + [route_id])) > NOTIFY_PAYLOAD_LIMIT:
+                cur.execute("SELECT pg_notify(%s, %s)", (TRIPS_UPDATED_CHANNEL, ",".join(payload)))
+                payload = []
+            payload.append(route_id)
+        if payload:
+            cur.execute("SELECT pg_notify(%s, %s)", (TRIPS_UPDATED_CHANNEL, ",".join(payload)))
+
+    def get_latest_trips(self, route_ids: List[str]) -> List[Dict[str, Any]]:
+        self._ensure_connection()
+        with self.conn.cursor() as cur:
+            cur.execute(
+                """
+                SELECT route_id, trip_id, start_time, end_time
+                FROM trip_latest
+                WHERE route_id = ANY(%s)
+                  AND collected_at >= NOW() - interval '1 day'
+                """,
+                (route_ids,)
+            )
+            rows = cur.fetchall()
+        self.conn.commit()
+        return [
+            {"route_id": r[0], "trip_id": r[1], "start_time": r[2], "end_time": r[3]}
+            for r in rows
+        ]
+
+    def maintain_partitions(self, days_ahead: int, retention_days: int) -> Tuple[int, int]:
+        self._ensure_connection()
+        try:
+            with self.conn.cursor() as cur:
+                cur.execute(
+                    "SELECT created, dropped FROM maintain_trip_partitions(%s, %s)",
+                    (days_ahead, retention_days)
+                )
+                created, dropped = cur.fetchone()
+            self.conn.commit()
+        except Exception as e:
+            if not self.conn.closed:
+                self.conn.rollback()
+            raise e
+        return created, dropped
+
+    def refresh_stats_rollups(self, tz: str, lookback_days: int) -> int:
+        self._ensure_connection()
         try:
             with self.conn.cursor() as cur:
-                for trip in trips:
-                    cur.execute(
-                        """
-                        INSERT INTO trips (route_id, trip_id, start_time, end_time)
-                        VALUES (%s, %s, %s, %s)
-                        """,
-                        (trip["route_id"], trip["trip_id"], trip["start_time"], trip["end_time"])
-                    )
+                cur.execute("SELECT refresh_trip_stats_daily(%s, %s)", (tz, lookback_days))
+                rebuilt = cur.fetchone()[0]
             self.conn.commit()
         except Exception as e:
-            self.conn.rollback()
+            if not self.conn.closed:
+                self.conn.rollback()
             raise e
+        return rebuilt
 
     def close(self):
         self.conn.close()
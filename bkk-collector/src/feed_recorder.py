@@ -0,0 +1,46 @@
+import logging
+import os
+import time
+from datetime import datetime, timezone
+from typing import Iterator, Tuple
+
+logger = logging.getLogger(__name__)
+
+FEED_SUFFIX = ".pb"
+
+class FeedRecorder:
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def save(self, content: bytes, fetched_at: datetime) -> str:
+        path = os.path.join(self.directory, f"{int(fetched_at.timestamp() * 1000)}{FEED_SUFFIX}")
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+        return path
+
+class RecordedFeedSource:
+    def __init__(self, directory: str, speed: float = 0.0):
+        self.directory = directory
+        self.speed = speed
+
+    def paths(self) -> list:
+        names = [n for n in os.listdir(self.directory) if n.endswith(FEED_SUFFIX)]
+        return [os.path.join(self.directory, n) for n in sorted(names, key=lambda n: int(n[:-len(FEED_SUFFIX)]))]
+
+    def __iter__(self) -> Iterator[Tuple[datetime, bytes]]:
+        paths = self.paths()
+        logger.info("Replaying %d recorded feeds from %s", len(paths), self.directory)
+        first_recorded = first_replayed = None
+        for path in paths:
+            fetched_at = datetime.fromtimestamp(int(os.path.basename(path)[:-len(FEED_SUFFIX)]) / 1000, tz=timezone.utc)
+            if self.speed > 0:
+                if first_recorded is None:
+                    first_recorded, first_replayed = fetched_at, time.monotonic()
+                due = first_replayed + (fetched_at - first_recorded).total_seconds() / self.speed
+                time.sleep(max(0.0, due - time.monotonic()))
+            with open(path, "rb") as f:
+                content = f.read()
+            yield fetched_at, content
@@ -1,4 +1,5 @@
 import logging
+import signal
 import sys
 from config import Config
 from scheduler import CollectorScheduler
@@ -11,8 +12,13 @@ def setup_logging(level: str = "INFO") -> None:
     handler.setFormatter(logging.Formatter(fmt))
     root.addHandler(handler)
 
+def handle_sigterm(signum, frame) -> None:
+    raise KeyboardInterrupt
+
 def main() -> None:
     setup_logging()
+    # docker stop sends SIGTERM; shut down like on Ctrl+C so queued snapshots are spilled.
+    signal.signal(signal.SIGTERM, handle_sigterm)
     config = Config()
     scheduler = CollectorScheduler(config)
     scheduler.start(interval_minutes=1)
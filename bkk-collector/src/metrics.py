@@ -0,0 +1,46 @@
+import logging
+from prometheus_client import Counter, Gauge, Histogram, start_http_server
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+FEED_DOWNLOAD_SECONDS = Histogram(
+    "collector_feed_download_seconds", "TripUpdates.pb download latency",
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 20)
+)
+FEED_DOWNLOAD_BYTES = Counter("collector_feed_download_bytes_total", "Decoded feed bytes downloaded")
+FEED_REQUESTS = Counter("collector_feed_requests_total", "Feed requests by outcome", ["outcome"])
+FEED_PARSE_SECONDS = Histogram(
+    "collector_feed_parse_seconds", "Protobuf parse and route indexing time",
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+)
+FEEDS_SKIPPED = Counter("collector_feeds_skipped_total", "Feeds skipped without parsing", ["reason"])
+TRIPS_SEEN = Counter("collector_trips_seen_total", "Trips seen in the feed", ["route_id"])
+TRIPS_CHANGED = Counter("collector_trips_changed_total", "Changed trips queued for writing", ["route_id"])
+INSERT_SECONDS = Histogram(
+    "collector_insert_seconds", "Trip batch insert transaction latency",
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+)
+INSERT_ROWS = Counter("collector_insert_rows_total", "Trip rows inserted")
+INSERT_FAILURES = Counter("collector_insert_failures_total", "Failed trip batch inserts")
+SCHEDULER_LAG_SECONDS = Histogram(
+    "collector_scheduler_lag_seconds", "Delay between a job's scheduled and actual start", ["job"],
+    buckets=(0.001, 0.01, 0.1, 0.5, 1, 5, 15, 30, 60)
+)
+SCHEDULER_MISSED = Counter("collector_scheduler_missed_total", "Job runs missed by the scheduler", ["job"])
+WRITE_QUEUE_DEPTH = Gauge("collector_write_queue_batches", "Batches waiting in the write-behind queue")
+WRITE_SPILL_BYTES = Gauge("collector_write_spill_bytes", "Bytes waiting in the spill file")
+WRITE_LAG_SECONDS = Gauge("collector_write_lag_seconds", "Age of the oldest trip in the last written batch")
+OWNED_ROUTES = Gauge("collector_owned_routes", "Routes collected by this instance")
+
+def start_metrics_server(config: Config) -> None:
+    if config.COLLECTOR_METRICS_PORT <= 0:
+        return
+    try:
+        start_http_server(config.COLLECTOR_METRICS_PORT)
+    except OSError as e:
+        logger.error(
+            "Could not serve metrics on port %d, continuing without them: %s", config.COLLECTOR_METRICS_PORT, e
+        )
+        return
+    logger.info("Serving metrics on port %d", config.COLLECTOR_METRICS_PORT)
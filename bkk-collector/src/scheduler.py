@@ -1,9 +1,17 @@
 import logging
+from typing import Dict, List
+from datetime import datetime, timedelta, timezone
+from apscheduler.events import EVENT_JOB_MISSED, EVENT_JOB_SUBMITTED
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.interval import IntervalTrigger
 from config import Config
 from bkk_client import BkkClient
 from db_client import DBHandler
+from trip_state import TripStateCache
+from write_buffer import WriteBehindBuffer
+from feed_recorder import RecordedFeedSource
+from sharding import ShardCoordinator
+import metrics
 
 logger = logging.getLogger(__name__)
 
@@ -12,20 +20,62 @@ class CollectorScheduler:
         self.config = config
         self.client = BkkClient(config)
         self.scheduler = BackgroundScheduler(timezone=config.TZ)
+        self.trip_state = TripStateCache()
+        self.writer = WriteBehindBuffer(config)
+        self.coordinator = ShardCoordinator(config) if config.COLLECTOR_SHARDING else None
+        self._active_routes: List[str] = []
+        self.scheduler.add_listener(self._observe_job_event, EVENT_JOB_SUBMITTED | EVENT_JOB_MISSED)
 
     def start(self, interval_minutes: int = 1):
+        metrics.start_metrics_server(self.config)
         with DBHandler(self.config) as db:
             self.db = db
-            for route_id in self.config.ROUTE_IDS:
+            if self.coordinator is not None:
+                self._rebalance_safe()
                 self.scheduler.add_job(
-                    func=lambda rid=route_id: self._run_job_safe(rid),
-                    trigger=IntervalTrigger(minutes=interval_minutes),
-                    id=f"collector_job_{route_id}",
+                    func=self._rebalance_safe,
+                    trigger=IntervalTrigger(seconds=self.config.COLLECTOR_HEARTBEAT_SECONDS),
+                    id="shard_rebalance_job",
                     replace_existing=True,
                     max_instances=1,
                     coalesce=True,
                 )
-                self._run_job_safe(route_id)
+            self._sync_trip_state(self._route_ids())
+            logger.info("Seeded trip state with %d trips", len(self.trip_state))
+            self.writer.start()
+            if self.config.BKK_REPLAY_DIR:
+                self.scheduler.start()
+                self._maintain_partitions_safe()
+                self.replay(RecordedFeedSource(self.config.BKK_REPLAY_DIR, self.config.BKK_REPLAY_SPEED))
+                self._shutdown()
+                return
+            self.scheduler.add_job(
+                func=self._run_job_safe,
+                trigger=IntervalTrigger(minutes=interval_minutes),
+                id="collector_job",
+                replace_existing=True,
+                max_instances=1,
+                coalesce=True,
+            )
+            self._run_job_safe()
+            self.scheduler.add_job(
+                func=self._maintain_partitions_safe,
+                trigger=IntervalTrigger(hours=1),
+                id="partition_maintenance_job",
+                replace_existing=True,
+                max_instances=1,
+                coalesce=True,
+            )
+            self._maintain_partitions_safe()
+            self.scheduler.add_job(
+                func=self._refresh_stats_rollups_safe,
+                trigger=IntervalTrigger(hours=1, start_date=datetime.now(timezone.utc) + timedelta(minutes=30)),
+                id="stats_rollup_job",
+                replace_existing=True,
+                max_instances=1,
+                coalesce=True,
+            )
+            self._refresh_stats_rollups_safe()
 
             self.scheduler.start()
             logger.info("Scheduler started. Interval: every %d minute(s)", interval_minutes)
@@ -38,11 +88,123 @@ class CollectorScheduler:
                     t.join()
             except KeyboardInterrupt:
                 logger.info("Shutting down collector service")
+                self.writer.stop()
+                self._shutdown()
 
-    def _run_job_safe(self, route_id: str) -> None:
+    def _shutdown(self) -> None:
+        self.scheduler.shutdown()
+        self.client.close()
+        if self.coordinator is not None:
+            self.coordinator.close()
+
+    def _observe_job_event(self, event) -> None:
+        if event.code == EVENT_JOB_MISSED:
+            metrics.SCHEDULER_MISSED.labels(event.job_id).inc()
+            return
+        lag = datetime.now(timezone.utc) - min(event.scheduled_run_times)
+        metrics.SCHEDULER_LAG_SECONDS.labels(event.job_id).observe(max(0.0, lag.total_seconds()))
+
+    def _route_ids(self) -> List[str]:
+        return self.coordinator.owned_routes() if self.coordinator is not None else self.config.ROUTE_IDS
+
+    def _sync_trip_state(self, route_ids: List[str]) -> None:
+        acquired = [r for r in route_ids if r not in self._active_routes]
+        for route_id in self._active_routes:
+            if route_id not in route_ids:
+                self.trip_state.forget(route_id)
+        self._active_routes = route_ids
+        metrics.OWNED_ROUTES.set(len(route_ids))
+        if acquired:
+            try:
+                self.trip_state.seed(self.db.get_latest_trips(acquired))
+            except Exception as e:
+                logger.warning("Could not seed trip state for routes %s: %s", acquired, e)
+
+    def _rebalance_safe(self) -> None:
+        try:
+            self.coordinator.rebalance(self.config.ROUTE_IDS)
+        except Exception as e:
+            logger.exception("Shard rebalance failed: %s", e)
+
+    def _run_job_safe(self) -> None:
+        route_ids = self._route_ids()
+        self._sync_trip_state(route_ids)
+        if not route_ids:
+            logger.info("No routes owned by this instance, skipping")
+            return
+        try:
+            trips_by_route = self.client.fetch_tripupdates_by_route(route_ids)
+        except Exception as e:
+            logger.exception("Collector feed fetch failed: %s", e)
+            return
+        if trips_by_route is None:
+            return
+
+        self._ingest(trips_by_route, datetime.now(timezone.utc))
+
+    def replay(self, source: RecordedFeedSource) -> None:
+        feeds = 0
+        for fetched_at, content in source:
+            route_ids = self._route_ids()
+            self._sync_trip_state(route_ids)
+            try:
+                trips_by_route = self.client.tripupdates_from_feed(content, route_ids)
+            except Exception as e:
+                logger.exception("Recorded feed from %s could not be parsed: %s", fetched_at.isoformat(), e)
+                continue
+            if trips_by_route is not None:
+                self._ingest(trips_by_route, fetched_at, block=True)
+            feeds += 1
+        self.writer.flush()
+        self.writer.stop()
+        logger.info("Replay finished after %d feeds", feeds)
+
+    def _ingest(self, trips_by_route: Dict[str, List[dict]], collected_at: datetime, block: bool = False) -> None:
+        changed_by_route = {
+            route_id: self.trip_state.changed(route_id, trips)
+            for route_id, trips in trips_by_route.items()
+        }
+        self.writer.submit([
+            {**trip, "collected_at": collected_at}
+            for route_trips in changed_by_route.values() for trip in route_trips
+        ], block=block)
+
+        for route_id, route_trips in trips_by_route.items():
+            metrics.TRIPS_SEEN.labels(route_id).inc(len(route_trips))
+            metrics.TRIPS_CHANGED.labels(route_id).inc(len(changed_by_route[route_id]))
+            logger.info(
+                "Job finished for route %s. Seen %d trips, queued %d changed.",
+                route_id, len(route_trips), len(changed_by_route[route_id])
+            )
+        stats = self.writer.stats()
+        metrics.WRITE_QUEUE_DEPTH.set(stats["queue_depth"])
+        metrics.WRITE_SPILL_BYTES.set(stats["spill_bytes"])
+        if stats["last_write_lag_seconds"] is not None:
+            metrics.WRITE_LAG_SECONDS.set(stats["last_write_lag_seconds"])
+        logger.info("Write buffer: %s", stats)
+
+    def _is_maintainer(self) -> bool:
+        return self.coordinator is None or self.coordinator.is_leader()
+
+    def _maintain_partitions_safe(self) -> None:
+        if not self._is_maintainer():
+            return
+        # Maintenance jobs run on their own scheduler threads, so they do not share self.db with the collector job.
+        try:
+            with DBHandler(self.config) as db:
+                created, dropped = db.maintain_partitions(
+                    self.config.TRIPS_PARTITION_DAYS_AHEAD, self.config.TRIPS_RETENTION_DAYS
+                )
+            logger.info("Partition maintenance finished. Created %d, dropped %d.", created, dropped)
+        except Exception as e:
+            logger.exception("Partition maintenance failed: %s", e)
+
+    def _refresh_stats_rollups_safe(self) -> None:
+        if not self._is_maintainer():
+            return
         try:
-            trips = self.client.fetch_tripupdates(route_id)
-            self.db.insert_trips(trips)
-            logger.info("Job finished for route %s. Inserted %d trips.", route_id, len(trips))
+            with DBHandler(self.config) as db:
+                rebuilt = db.refresh_stats_rollups(self.config.TZ, self.config.STATS_ROLLUP_LOOKBACK_DAYS)
+            logger.info("Stats rollup refresh finished. Rebuilt %d rows.", rebuilt)
         except Exception as e:
-            logger.exception("Collector job failed for route %s: %s", route_id, e)
+            logger.exception("Stats rollup refresh failed: %s", e)
@@ -0,0 +1,144 @@
+import bisect
+import hashlib
+import logging
+import threading
+import time
+from typing import Dict, Iterable, List, Set, Tuple
+import psycopg2
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+def _hash64(value: str) -> int:
+    return int.from_bytes(hashlib.sha1(value.encode("utf-8")).digest()[:8], "big", signed=True)
+
+def advisory_lock_key(name: str) -> int:
+    return _hash64(f"bkk-collector:{name}")
+
+class HashRing:
+    def __init__(self, members: Iterable[str], vnodes: int):
+        self._points: List[Tuple[int, str]] = sorted(
+            (_hash64(f"{member}#{i}"), member) for member in members for i in range(vnodes)
+        )
+        self._keys = [point for point, _ in self._points]
+
+    def owner(self, key: str) -> str | None:
+        if not self._points:
+            return None
+        index = bisect.bisect(self._keys, _hash64(key)) % len(self._points)
+        return self._points[index][1]
+
+class ShardCoordinator:
+    LEADER_LOCK = "leader"
+
+    def __init__(self, config: Config):
+        self.config = config
+        self.instance_id = config.COLLECTOR_INSTANCE_ID
+        self.lease_seconds = config.COLLECTOR_LEASE_SECONDS
+        self.vnodes = config.COLLECTOR_HASH_VNODES
+        self.db_config: Dict[str, object] = {
+            "dbname": config.POSTGRES_DB,
+            "user": config.POSTGRES_USER,
+            "password": config.POSTGRES_PASSWORD,
+            "host": config.POSTGRES_HOST,
+            "port": config.POSTGRES_PORT,
+        }
+        self.conn = None
+        self._owned: Set[str] = set()
+        self._leader = False
+        self._valid_until = 0.0
+        self._lock = threading.Lock()
+
+    def _connection(self):
+        if self.conn is None or self.conn.closed:
+            # Session advisory locks die with the old session.
+            self._release_all()
+            self.conn = psycopg2.connect(**self.db_config)
+            self.conn.autocommit = True
+        return self.conn
+
+    def _release_all(self) -> None:
+        with self._lock:
+            self._owned, self._leader, self._valid_until = set(), False, 0.0
+
+    def _heartbeat(self, cur) -> List[str]:
+        cur.execute(
+            """
+            INSERT INTO collector_instances (instance_id, heartbeat_at)
+            VALUES (%s, NOW())
+            ON CONFLICT (instance_id) DO UPDATE SET heartbeat_at = NOW()
+            """,
+            (self.instance_id,)
+        )
+        cur.execute(
+            "DELETE FROM collector_instances WHERE heartbeat_at < NOW() - make_interval(secs => %s)",
+            (self.lease_seconds * 2,)
+        )
+        cur.execute(
+            """
+            SELECT instance_id FROM collector_instances
+            WHERE heartbeat_at >= NOW() - make_interval(secs => %s)
+            ORDER BY instance_id
+            """,
+            (self.lease_seconds,)
+        )
+        return [r[0] for r in cur.fetchall()]
+
+    def _try_lock(self, cur, name: str) -> bool:
+        cur.execute("SELECT pg_try_advisory_lock(%s)", (advisory_lock_key(name),))
+        return cur.fetchone()[0]
+
+    def _unlock(self, cur, name: str) -> None:
+        cur.execute("SELECT pg_advisory_unlock(%s)", (advisory_lock_key(name),))
+
+    def rebalance(self, route_ids: Iterable[str]) -> List[str]:
+        try:
+            with self._connection().cursor() as cur:
+                members = self._heartbeat(cur)
+                ring = HashRing(members, self.vnodes)
+                desired = {r for r in route_ids if ring.owner(r) == self.instance_id}
+                owned = set(self._owned)
+                leader = self._leader
+                for route_id in owned - desired:
+                    self._unlock(cur, f"route:{route_id}")
+                    owned.discard(route_id)
+                for route_id in desired - owned:
+                    if self._try_lock(cur, f"route:{route_id}"):
+                        owned.add(route_id)
+                if not leader:
+                    leader = self._try_lock(cur, self.LEADER_LOCK)
+        except Exception:
+            # Closing the session frees its locks, so peers may take the routes on their next heartbeat.
+            self._release_all()
+            if self.conn is not None and not self.conn.closed:
+                self.conn.close()
+            raise
+
+        with self._lock:
+            self._owned = owned
+            self._leader = leader
+            self._valid_until = time.monotonic() + self.lease_seconds
+        logger.info(
+            "Shard rebalance: %d live instances, %d routes assigned, %d locked%s",
+            len(members), len(desired), len(owned), ", leader" if leader else ""
+        )
+        return sorted(owned)
+
+    def owned_routes(self) -> List[str]:
+        with self._lock:
+            if time.monotonic() > self._valid_until:
+                return []
+            return sorted(self._owned)
+
+    def is_leader(self) -> bool:
+        with self._lock:
+            return self._leader and time.monotonic() <= self._valid_until
+
+    def close(self) -> None:
+        if self.conn is None or self.conn.closed:
+            return
+        try:
+            with self.conn.cursor() as cur:
+                cur.execute("DELETE FROM collector_instances WHERE instance_id = %s", (self.instance_id,))
+        finally:
+            self.conn.close()
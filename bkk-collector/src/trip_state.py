@@ -0,0 +1,30 @@
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+TripTimes = Tuple[Optional[datetime], Optional[datetime]]
+
+class TripStateCache:
+    def __init__(self):
+        self._state: Dict[str, Dict[str, TripTimes]] = {}
+
+    def seed(self, rows: List[Dict[str, Any]]) -> None:
+        for row in rows:
+            self._state.setdefault(row["route_id"], {})[row["trip_id"]] = (row["start_time"], row["end_time"])
+
+    def changed(self, route_id: str, trips: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        previous = self._state.get(route_id, {})
+        current: Dict[str, TripTimes] = {}
+        changed = []
+        for trip in trips:
+            times = (trip["start_time"], trip["end_time"])
+            current[trip["trip_id"]] = times
+            if previous.get(trip["trip_id"]) != times:
+                changed.append(trip)
+        self._state[route_id] = current
+        return changed
+
+    def forget(self, route_id: str) -> None:
+        self._state.pop(route_id, None)
+
+    def __len__(self) -> int:
+        return sum(len(trips) for trips in self._state.values())
@@ -0,0 +1,215 @@
+import json
+import logging
+import os
+import queue
+import threading
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from config import Config
+from db_client import DBHandler
+
+logger = logging.getLogger(__name__)
+
+TRIP_TIME_FIELDS = ("start_time", "end_time", "collected_at")
+
+def _encode_trip(trip: Dict[str, Any]) -> Dict[str, Any]:
+    return {k: v.isoformat() if k in TRIP_TIME_FIELDS and v is not None else v for k, v in trip.items()}
+
+def _decode_trip(trip: Dict[str, Any]) -> Dict[str, Any]:
+    return {k: datetime.fromisoformat(v) if k in TRIP_TIME_FIELDS and v is not None else v for k, v in trip.items()}
+
+class SpillFile:
+    def __init__(self, path: str):
+        self.path = path
+        self.replay_path = f"{path}.replay"
+        self.offset_path = f"{path}.replay.offset"
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    def append(self, trips: List[Dict[str, Any]]) -> None:
+        line = json.dumps([_encode_trip(t) for t in trips], separators=(",", ":")) + "\n"
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(line)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def size(self) -> int:
+        size = sum(os.path.getsize(p) for p in (self.path, self.replay_path) if os.path.exists(p))
+        return size - self._committed_offset() if os.path.exists(self.replay_path) else size
+
+    def pending(self) -> bool:
+        return self.size() > 0
+
+    def _committed_offset(self) -> int:
+        try:
+            with open(self.offset_path, encoding="utf-8") as f:
+                return int(f.read())
+        except (OSError, ValueError):
+            return 0
+
+    def _commit_offset(self, offset: int) -> None:
+        tmp_path = f"{self.offset_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(str(offset))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.offset_path)
+
+    def _read_chunks(self, f, batch_rows: int) -> Iterator[Tuple[List[Dict[str, Any]], int, int]]:
+        trips: List[Dict[str, Any]] = []
+        entries = 0
+        while True:
+            line_start = f.tell()
+            line = f.readline()
+            if not line:
+                break
+            try:
+                entry = [_decode_trip(t) for t in json.loads(line)]
+            except ValueError:
+                logger.warning("Skipping unreadable spill entry in %s", self.replay_path)
+                continue
+            if trips and len(trips) + len(entry) > batch_rows:
+                yield trips, entries, line_start
+                trips, entries = [], 0
+            trips.extend(entry)
+            entries += 1
+        if trips:
+            yield trips, entries, f.tell()
+
+    def replay(self, db: DBHandler, batch_rows: int) -> int:
+        with self._lock:
+            if not os.path.exists(self.replay_path) and os.path.exists(self.path):
+                if os.path.exists(self.offset_path):
+                    os.remove(self.offset_path)
+                os.replace(self.path, self.replay_path)
+        if not os.path.exists(self.replay_path):
+            return 0
+
+        # Stream the file in chunks and remember how far it is written, so a long outage's spill
+        # never has to fit in memory and a failed chunk resumes where it stopped.
+        replayed = 0
+        with open(self.replay_path, "rb") as f:
+            f.seek(self._committed_offset())
+            for trips, entries, offset in self._read_chunks(f, batch_rows):
+                db.insert_trips(trips)
+                self._commit_offset(offset)
+                replayed += entries
+        # The offset goes first: a crash in between replays the file again rather than skipping a new one.
+        if os.path.exists(self.offset_path):
+            os.remove(self.offset_path)
+        os.remove(self.replay_path)
+        return replayed
+
+class WriteBehindBuffer(threading.Thread):
+    def __init__(self, config: Config):
+        super().__init__(name="trip-writer", daemon=True)
+        self.config = config
+        self.batch_rows = config.COLLECTOR_WRITE_BATCH_ROWS
+        self.retry_seconds = config.COLLECTOR_WRITE_RETRY_SECONDS
+        self.spill = SpillFile(config.COLLECTOR_SPILL_PATH)
+        self._queue: "queue.Queue[List[Dict[str, Any]]]" = queue.Queue(maxsize=config.COLLECTOR_QUEUE_MAX_BATCHES)
+        self._stop_event = threading.Event()
+        self._db: Optional[DBHandler] = None
+        self.written_rows = 0
+        self.spilled_batches = 0
+        self.last_write_lag: Optional[float] = None
+
+    def submit(self, trips: List[Dict[str, Any]], block: bool = False) -> None:
+        if not trips:
+            return
+        try:
+            self._queue.put(trips, block=block)
+        except queue.Full:
+            logger.warning("Write queue full, spilling %d trips to %s", len(trips), self.spill.path)
+            self._spill([trips])
+
+    def _spill(self, batches: List[List[Dict[str, Any]]]) -> None:
+        for trips in batches:
+            try:
+                self.spill.append(trips)
+                self.spilled_batches += 1
+            except OSError as e:
+                logger.error("Failed to spill %d trips, they are lost: %s", len(trips), e)
+
+    def _drain(self, first: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+        batches = [first]
+        rows = len(first)
+        while rows < self.batch_rows:
+            try:
+                batch = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            batches.append(batch)
+            rows += len(batch)
+        return batches
+
+    def _connection(self) -> DBHandler:
+        if self._db is None:
+            self._db = DBHandler(self.config)
+        return self._db
+
+    def _write(self, batches: List[List[Dict[str, Any]]]) -> None:
+        trips = [t for batch in batches for t in batch]
+        self._connection().insert_trips(trips)
+        self.written_rows += len(trips)
+        self.last_write_lag = (datetime.now(timezone.utc) - min(t["collected_at"] for t in trips)).total_seconds()
+
+    def _replay_spill(self) -> None:
+        replayed = self.spill.replay(self._connection(), self.batch_rows)
+        if replayed:
+            logger.info("Replayed %d spilled batches", replayed)
+
+    def run(self) -> None:
+        while not self._stop_event.is_set():
+            try:
+                first = self._queue.get(timeout=self.retry_seconds)
+            except queue.Empty:
+                first = None
+
+            batches = self._drain(first) if first is not None else []
+            try:
+                if batches:
+                    self._write(batches)
+            except Exception as e:
+                logger.exception("Trip write failed, spilling %d batches: %s", len(batches), e)
+                self._spill(batches)
+                self._stop_event.wait(self.retry_seconds)
+                continue
+            finally:
+                for _ in batches:
+                    self._queue.task_done()
+
+            if self.spill.pending():
+                try:
+                    self._replay_spill()
+                except Exception as e:
+                    logger.exception("Spill replay failed, retrying: %s", e)
+                    self._stop_event.wait(self.retry_seconds)
+
+    def flush(self) -> None:
+        self._queue.join()
+
+    def stop(self, timeout: float = 10.0) -> None:
+        self._stop_event.set()
+        self.join(timeout)
+        remaining = []
+        while True:
+            try:
+                remaining.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        self._spill(remaining)
+        if self.is_alive():
+            # The writer is still inside a write on this connection; it is closed with the process instead.
+            logger.warning("Trip writer did not stop within %.0fs, leaving its connection open", timeout)
+        elif self._db is not None:
+            self._db.close()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queue_depth": self._queue.qsize(),
+            "spill_bytes": self.spill.size(),
+            "spilled_batches": self.spilled_batches,
+            "written_rows": self.written_rows,
+            "last_write_lag_seconds": self.last_write_lag,
+        }
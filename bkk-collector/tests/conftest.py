@@ -0,0 +1,47 @@
+import os
+import sys
+import uuid
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent.parent
+sys.path.insert(0, str(ROOT / "bkk-collector" / "src"))
+INIT_SQL = ROOT / "bkk-db" / "postgres" / "init.sql"
+
+@pytest.fixture(scope="session")
+def database():
+    psycopg2 = pytest.importorskip("psycopg2")
+    server = {
+        "user": os.getenv("POSTGRES_USER", "postgres"),
+        "password": os.getenv("POSTGRES_PASSWORD", ""),
+        "host": os.getenv("POSTGRES_HOST", "localhost"),
+        "port": int(os.getenv("POSTGRES_PORT", "5432")),
+    }
+    try:
+        admin = psycopg2.connect(dbname=os.getenv("POSTGRES_DB", "postgres"), **server)
+    except psycopg2.OperationalError as e:
+        pytest.skip(f"No Postgres for a throwaway database: {e}")
+    admin.autocommit = True
+    name = f"bkk_test_{uuid.uuid4().hex[:12]}"
+    with admin.cursor() as cur:
+        cur.execute(f"CREATE DATABASE {name} ENCODING 'UTF8' TEMPLATE template0")
+    try:
+        with psycopg2.connect(dbname=name, **server) as conn, conn.cursor() as cur:
+            cur.execute(INIT_SQL.read_text())
+        yield {"dbname": name, **server}
+    finally:
+        with admin.cursor() as cur:
+            cur.execute(f"DROP DATABASE IF EXISTS {name} WITH (FORCE)")
+        admin.close()
+
+@pytest.fixture
+def collector_env(database, monkeypatch):
+    monkeypatch.setenv("POSTGRES_DB", database["dbname"])
+    monkeypatch.setenv("POSTGRES_USER", database["user"])
+    monkeypatch.setenv("POSTGRES_PASSWORD", database["password"] or "unused")
+    monkeypatch.setenv("POSTGRES_HOST", database["host"])
+    monkeypatch.setenv("POSTGRES_PORT", str(database["port"]))
+    monkeypatch.setenv("BKK_API_KEY", "unused")
+    monkeypatch.setenv("COLLECTOR_METRICS_PORT", "0")
+    return database
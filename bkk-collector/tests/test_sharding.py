@@ -0,0 +1,83 @@
+import time
+from contextlib import suppress
+
+import pytest
+
+ROUTES = [f"{i:04d}" for i in range(1, 41)]
+
+@pytest.fixture
+def coordinators(collector_env, monkeypatch):
+    import psycopg2
+    from config import Config
+    from sharding import ShardCoordinator
+
+    with psycopg2.connect(**collector_env) as conn, conn.cursor() as cur:
+        cur.execute("TRUNCATE collector_instances")
+    monkeypatch.setenv("COLLECTOR_SHARDING", "true")
+    monkeypatch.setenv("COLLECTOR_LEASE_SECONDS", "1")
+    created = []
+
+    def coordinator(instance_id: str) -> ShardCoordinator:
+        monkeypatch.setenv("COLLECTOR_INSTANCE_ID", instance_id)
+        created.append(ShardCoordinator(Config()))
+        return created[-1]
+
+    yield coordinator
+    for c in created:
+        with suppress(Exception):
+            c.close()
+
+def terminate(database, coordinator) -> None:
+    import psycopg2
+
+    with psycopg2.connect(**database) as conn, conn.cursor() as cur:
+        cur.execute("SELECT pg_terminate_backend(%s)", (coordinator.conn.get_backend_pid(),))
+
+def test_routes_hand_over_without_overlap(coordinators):
+    a, b = coordinators("a"), coordinators("b")
+    assert a.rebalance(ROUTES) == ROUTES
+    assert a.is_leader()
+
+    # b joins: the routes it is assigned stay locked by a until a lets go of them.
+    assert b.rebalance(ROUTES) == []
+    a.rebalance(ROUTES)
+    b.rebalance(ROUTES)
+
+    owned_a, owned_b = set(a.owned_routes()), set(b.owned_routes())
+    assert owned_a and owned_b
+    assert owned_a.isdisjoint(owned_b)
+    assert owned_a | owned_b == set(ROUTES)
+    assert a.is_leader() and not b.is_leader()
+
+def test_survivor_takes_over_a_dead_instance(collector_env, coordinators):
+    a, b = coordinators("a"), coordinators("b")
+    a.rebalance(ROUTES)
+    b.rebalance(ROUTES)
+    a.rebalance(ROUTES)
+    b.rebalance(ROUTES)
+
+    # The process dies: its session ends without deregistering.
+    terminate(collector_env, a)
+    time.sleep(1.2)
+
+    assert b.rebalance(ROUTES) == ROUTES
+    assert b.is_leader()
+
+def test_dropped_connection_releases_routes_at_once(collector_env, coordinators):
+    a, b = coordinators("a"), coordinators("b")
+    b.rebalance(ROUTES)
+    assert a.rebalance(ROUTES) == []
+    b.rebalance(ROUTES)
+    assert a.rebalance(ROUTES)
+    taken = set(b.owned_routes())
+
+    terminate(collector_env, b)
+    with pytest.raises(Exception):
+        b.rebalance(ROUTES)
+
+    assert b.owned_routes() == []
+    assert not b.is_leader()
+    # a may now lock b's routes, and b must not write them in the meantime.
+    time.sleep(1.2)
+    assert taken <= set(a.rebalance(ROUTES))
+    assert a.is_leader()
@@ -0,0 +1,113 @@
+import threading
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+class FakeDB:
+    def __init__(self, block: threading.Event | None = None):
+        self.block = block
+        self.started = threading.Event()
+        self.inserted = []
+        self.closed = False
+
+    def insert_trips(self, trips):
+        self.started.set()
+        if self.block is not None:
+            self.block.wait()
+        self.inserted.extend(trips)
+
+    def close(self):
+        self.closed = True
+
+def trip(i: int) -> dict:
+    start = datetime(2026, 3, 30, 6, 0, tzinfo=timezone.utc) + timedelta(minutes=i)
+    return {
+        "route_id": "0050",
+        "trip_id": f"t{i}",
+        "start_time": start,
+        "end_time": start + timedelta(minutes=40),
+        "collected_at": start,
+    }
+
+@pytest.fixture
+def config(tmp_path, monkeypatch):
+    monkeypatch.setenv("POSTGRES_USER", "unused")
+    monkeypatch.setenv("POSTGRES_PASSWORD", "unused")
+    monkeypatch.setenv("POSTGRES_DB", "unused")
+    monkeypatch.setenv("BKK_API_KEY", "unused")
+    monkeypatch.setenv("COLLECTOR_SPILL_PATH", str(tmp_path / "spill" / "trips.jsonl"))
+    from config import Config
+    return Config()
+
+def test_stop_keeps_the_connection_of_a_busy_writer(config):
+    from write_buffer import WriteBehindBuffer
+
+    release = threading.Event()
+    db = FakeDB(block=release)
+    writer = WriteBehindBuffer(config)
+    writer._db = db
+    writer.start()
+    writer.submit([trip(0)])
+    assert db.started.wait(5)
+
+    writer.stop(timeout=0.1)
+    assert writer.is_alive()
+    assert not db.closed
+
+    release.set()
+    writer.join(5)
+    assert db.inserted == [trip(0)]
+
+class FailingDB(FakeDB):
+    def __init__(self, fail_on_call: int):
+        super().__init__()
+        self.calls = 0
+        self.fail_on_call = fail_on_call
+
+    def insert_trips(self, trips):
+        self.calls += 1
+        if self.calls == self.fail_on_call:
+            raise RuntimeError("database went away")
+        super().insert_trips(trips)
+
+def spill_entries(spill, first: int, count: int, rows: int = 3) -> list:
+    trips = []
+    for e in range(first, first + count):
+        entry = [trip(e * rows + i) for i in range(rows)]
+        spill.append(entry)
+        trips.extend(entry)
+    return trips
+
+def test_spill_round_trips_in_chunks(tmp_path):
+    from write_buffer import SpillFile
+
+    spill = SpillFile(str(tmp_path / "trips.jsonl"))
+    trips = spill_entries(spill, 0, 10)
+    with open(spill.path, "a", encoding="utf-8") as f:
+        f.write("{not json\n")
+    db = FailingDB(fail_on_call=0)
+
+    assert spill.replay(db, batch_rows=7) == 10
+    assert db.inserted == trips
+    assert db.calls == 5
+    assert not spill.pending()
+    assert list(tmp_path.iterdir()) == []
+
+def test_failed_chunk_resumes_without_loss_or_duplicates(tmp_path):
+    from write_buffer import SpillFile
+
+    spill = SpillFile(str(tmp_path / "trips.jsonl"))
+    trips = spill_entries(spill, 0, 10)
+    db = FailingDB(fail_on_call=3)
+    with pytest.raises(RuntimeError):
+        spill.replay(db, batch_rows=7)
+    assert db.inserted == trips[:12]
+    assert spill.pending()
+
+    # Snapshots spilled during the outage wait for the next replay.
+    later = spill_entries(spill, 10, 2)
+    assert spill.replay(db, batch_rows=7) == 6
+    assert db.inserted == trips
+    assert spill.replay(db, batch_rows=7) == 2
+    assert db.inserted == trips + later
+    assert not spill.pending()
@@ -1,13 +1,283 @@
+-- Databases created before partitioning have a plain trips table. Move it aside with
+-- its key, sequence and indexes; its rows are copied once the partition functions exist.
+DO $$
+BEGIN
+    IF (SELECT relkind FROM pg_class WHERE oid = to_regclass('trips')) = 'r' THEN
+        ALTER TABLE trips RENAME TO trips_unpartitioned;
+        ALTER TABLE trips_unpartitioned RENAME CONSTRAINT trips_pkey TO trips_unpartitioned_pkey;
+        ALTER SEQUENCE trips_id_seq RENAME TO trips_unpartitioned_id_seq;
+        DROP INDEX IF EXISTS idx_trips_route_id, idx_trips_route_trip_latest;
+    END IF;
+END;
+$$;
+
 CREATE TABLE IF NOT EXISTS trips (
-    id BIGSERIAL PRIMARY KEY,
+    id BIGSERIAL,
     route_id TEXT NOT NULL,
     trip_id TEXT NOT NULL,
     start_time TIMESTAMPTZ,
     end_time   TIMESTAMPTZ,
-    collected_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
-);
+    collected_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (id, collected_at)
+) PARTITION BY RANGE (collected_at);
+
+CREATE TABLE IF NOT EXISTS trips_default
+PARTITION OF trips DEFAULT;
 
-CREATE INDEX IF NOT EXISTS idx_trips_route_id
-ON trips (route_id);
+CREATE INDEX IF NOT EXISTS idx_trips_route_start
+ON trips (route_id, start_time);
 CREATE INDEX IF NOT EXISTS idx_trips_route_trip_latest
-ON trips (route_id, trip_id, collected_at DESC);
\ No newline at end of file
+ON trips (route_id, trip_id, collected_at DESC);
+CREATE INDEX IF NOT EXISTS idx_trips_collected_at_brin
+ON trips USING BRIN (collected_at);
+CREATE INDEX IF NOT EXISTS idx_trips_start_time_brin
+ON trips USING BRIN (start_time);
+
+CREATE OR REPLACE FUNCTION create_trip_partitions(from_day DATE, to_day DATE)
+RETURNS INTEGER
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    part_day DATE := from_day;
+    partition_name TEXT;
+    created INTEGER := 0;
+BEGIN
+    WHILE part_day <= to_day LOOP
+        partition_name := format('trips_p%s', to_char(part_day, 'YYYYMMDD'));
+        IF to_regclass(partition_name) IS NULL THEN
+            EXECUTE format(
+                'CREATE TABLE %I PARTITION OF trips FOR VALUES FROM (%L) TO (%L)',
+                partition_name,
+                part_day::timestamp AT TIME ZONE 'UTC',
+                (part_day + 1)::timestamp AT TIME ZONE 'UTC'
+            );
+            created := created + 1;
+        END IF;
+        part_day := part_day + 1;
+    END LOOP;
+    RETURN created;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION drop_trip_partitions(retention_days INTEGER, detach_only BOOLEAN DEFAULT FALSE)
+RETURNS INTEGER
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    cutoff DATE := (NOW() AT TIME ZONE 'UTC')::date - retention_days;
+    partition_name TEXT;
+    dropped INTEGER := 0;
+BEGIN
+    FOR partition_name IN
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'trips'::regclass
+          AND c.relname ~ '^trips_p[0-9]{8}$'
+    LOOP
+        IF to_date(substring(partition_name FROM 8), 'YYYYMMDD') < cutoff THEN
+            IF detach_only THEN
+                EXECUTE format('ALTER TABLE trips DETACH PARTITION %I', partition_name);
+            ELSE
+                EXECUTE format('DROP TABLE %I', partition_name);
+            END IF;
+            dropped := dropped + 1;
+        END IF;
+    END LOOP;
+    RETURN dropped;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION maintain_trip_partitions(
+    days_ahead INTEGER,
+    retention_days INTEGER,
+    detach_only BOOLEAN DEFAULT FALSE
+)
+RETURNS TABLE (created INTEGER, dropped INTEGER)
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    utc_today DATE := (NOW() AT TIME ZONE 'UTC')::date;
+BEGIN
+    created := create_trip_partitions(utc_today, utc_today + days_ahead);
+    dropped := 0;
+    IF retention_days > 0 THEN
+        dropped := drop_trip_partitions(retention_days, detach_only);
+    END IF;
+    RETURN NEXT;
+END;
+$$;
+
+DO $$
+DECLARE
+    first_day DATE;
+    last_day DATE;
+BEGIN
+    IF to_regclass('trips_unpartitioned') IS NULL THEN
+        RETURN;
+    END IF;
+    SELECT MIN(collected_at AT TIME ZONE 'UTC')::date, MAX(collected_at AT TIME ZONE 'UTC')::date
+    INTO first_day, last_day
+    FROM trips_unpartitioned;
+    IF first_day IS NOT NULL THEN
+        PERFORM create_trip_partitions(first_day, last_day);
+    END IF;
+
+    INSERT INTO trips (id, route_id, trip_id, start_time, end_time, collected_at)
+    SELECT id, route_id, trip_id, start_time, end_time, collected_at
+    FROM trips_unpartitioned;
+    PERFORM setval(pg_get_serial_sequence('trips', 'id'), GREATEST((SELECT MAX(id) FROM trips), 1));
+    DROP TABLE trips_unpartitioned;
+END;
+$$;
+
+CREATE TABLE IF NOT EXISTS trip_latest (
+    route_id TEXT NOT NULL,
+    trip_id TEXT NOT NULL,
+    start_time TIMESTAMPTZ,
+    end_time   TIMESTAMPTZ,
+    collected_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (route_id, trip_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_trip_latest_route_start
+ON trip_latest (route_id, start_time);
+
+CREATE TABLE IF NOT EXISTS routes (
+    route_id TEXT PRIMARY KEY,
+    first_seen TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    last_seen TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    trip_count BIGINT NOT NULL DEFAULT 0,
+    observation_count BIGINT NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS collector_instances (
+    instance_id TEXT PRIMARY KEY,
+    started_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    heartbeat_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+CREATE TABLE IF NOT EXISTS trip_stats_daily (
+    route_id TEXT NOT NULL,
+    local_date DATE NOT NULL,
+    period TEXT NOT NULL,
+    total_minutes DOUBLE PRECISION NOT NULL,
+    trip_count INTEGER NOT NULL,
+    min_minutes DOUBLE PRECISION NOT NULL,
+    max_minutes DOUBLE PRECISION NOT NULL,
+    duration_sketch JSONB NOT NULL,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (route_id, local_date, period)
+);
+
+CREATE TABLE IF NOT EXISTS trip_stats_watermark (
+    id BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (id),
+    rolled_through DATE NOT NULL
+);
+
+-- Rollups written before duration sketches have none: drop them together with the
+-- watermark, so the next refresh_trip_stats_daily rebuilds every day with sketches.
+ALTER TABLE trip_stats_daily ADD COLUMN IF NOT EXISTS duration_sketch JSONB;
+DELETE FROM trip_stats_watermark
+WHERE EXISTS (SELECT 1 FROM trip_stats_daily WHERE duration_sketch IS NULL);
+DELETE FROM trip_stats_daily WHERE duration_sketch IS NULL;
+ALTER TABLE trip_stats_daily ALTER COLUMN duration_sketch SET NOT NULL;
+
+-- Must match TripService.PERIOD_BOUNDS in the api service, which checks this at startup when it reads rollups.
+CREATE OR REPLACE FUNCTION classify_trip_period(local_time TIME)
+RETURNS TEXT
+LANGUAGE sql
+IMMUTABLE
+AS $$
+    SELECT CASE
+        WHEN local_time < TIME '07:00' THEN 'morning'
+        WHEN local_time < TIME '10:00' THEN 'peak (morning)'
+        WHEN local_time < TIME '15:00' THEN 'daytime'
+        WHEN local_time < TIME '18:00' THEN 'peak (afternoon)'
+        ELSE 'afternoon'
+    END;
+$$;
+
+-- Replaced by the version with a sketch accuracy argument.
+DROP FUNCTION IF EXISTS rebuild_trip_stats_daily(DATE, DATE, TEXT);
+
+-- Duration sketches use the DDSketch layout of the api service (sketch.py):
+-- bin k counts durations in (gamma^(k-1), gamma^k], gamma = (1 + alpha) / (1 - alpha).
+CREATE OR REPLACE FUNCTION rebuild_trip_stats_daily(from_date DATE, to_date DATE, tz TEXT, alpha DOUBLE PRECISION DEFAULT 0.01)
+RETURNS INTEGER
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    log_gamma DOUBLE PRECISION := LN((1 + alpha) / (1 - alpha));
+    rebuilt INTEGER;
+BEGIN
+    DELETE FROM trip_stats_daily
+    WHERE local_date BETWEEN from_date AND to_date;
+
+    INSERT INTO trip_stats_daily (
+        route_id, local_date, period, total_minutes, trip_count, min_minutes, max_minutes, duration_sketch
+    )
+    SELECT route_id,
+           local_date,
+           period,
+           SUM(bin_total),
+           SUM(bin_count),
+           MIN(bin_min),
+           MAX(bin_max),
+           jsonb_build_object('alpha', alpha, 'bins', jsonb_object_agg(bin, bin_count))
+    FROM (
+        SELECT route_id,
+               start_local::date AS local_date,
+               classify_trip_period(start_local::time) AS period,
+               CEIL(LN(duration_min) / log_gamma)::integer AS bin,
+               SUM(duration_min) AS bin_total,
+               COUNT(*) AS bin_count,
+               MIN(duration_min) AS bin_min,
+               MAX(duration_min) AS bin_max
+        FROM (
+            SELECT route_id,
+                   start_time AT TIME ZONE tz AS start_local,
+                   EXTRACT(EPOCH FROM (end_time AT TIME ZONE tz) - (start_time AT TIME ZONE tz))::float8 / 60.0 AS duration_min
+            FROM trip_latest
+            WHERE start_time >= from_date::timestamp AT TIME ZONE tz
+              AND start_time < (to_date + 1)::timestamp AT TIME ZONE tz
+              AND end_time < NOW()
+        ) local_trips
+        WHERE duration_min > 0
+        GROUP BY 1, 2, 3, 4
+    ) binned_trips
+    GROUP BY 1, 2, 3;
+
+    GET DIAGNOSTICS rebuilt = ROW_COUNT;
+    RETURN rebuilt;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION refresh_trip_stats_daily(tz TEXT, lookback_days INTEGER DEFAULT 1)
+RETURNS INTEGER
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    yesterday DATE := (NOW() AT TIME ZONE tz)::date - 1;
+    from_date DATE;
+    rebuilt INTEGER;
+BEGIN
+    SELECT rolled_through - lookback_days + 1 INTO from_date
+    FROM trip_stats_watermark;
+    IF from_date IS NULL THEN
+        SELECT MIN(start_time AT TIME ZONE tz)::date INTO from_date
+        FROM trip_latest;
+    END IF;
+    IF from_date IS NULL OR from_date > yesterday THEN
+        RETURN 0;
+    END IF;
+
+    rebuilt := rebuild_trip_stats_daily(from_date, yesterday, tz);
+
+    INSERT INTO trip_stats_watermark (rolled_through)
+    VALUES (yesterday)
+    ON CONFLICT (id) DO UPDATE
+    SET rolled_through = GREATEST(trip_stats_watermark.rolled_through, EXCLUDED.rolled_through);
+    RETURN rebuilt;
+END;
+$$;
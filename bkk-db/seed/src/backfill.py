@@ -0,0 +1,40 @@
+def backfill_trip_latest(cur) -> int:
+    cur.execute("""
+        INSERT INTO trip_latest (route_id, trip_id, start_time, end_time, collected_at)
+        SELECT DISTINCT ON (route_id, trip_id)
+            route_id, trip_id, start_time, end_time, collected_at
+        FROM trips
+        ORDER BY route_id, trip_id, collected_at DESC
+        ON CONFLICT (route_id, trip_id) DO UPDATE
+        SET start_time = EXCLUDED.start_time,
+            end_time = EXCLUDED.end_time,
+            collected_at = EXCLUDED.collected_at
+        WHERE trip_latest.collected_at <= EXCLUDED.collected_at;
+    """)
+    return cur.rowcount
+
+
+def backfill_routes(cur) -> int:
+    cur.execute("""
+        INSERT INTO routes (route_id, first_seen, last_seen, trip_count, observation_count)
+        SELECT t.route_id, MIN(t.collected_at), MAX(t.collected_at),
+               (SELECT COUNT(*) FROM trip_latest l WHERE l.route_id = t.route_id),
+               COUNT(*)
+        FROM trips t
+        GROUP BY t.route_id
+        ON CONFLICT (route_id) DO UPDATE
+        SET first_seen = LEAST(routes.first_seen, EXCLUDED.first_seen),
+            last_seen = GREATEST(routes.last_seen, EXCLUDED.last_seen),
+            trip_count = EXCLUDED.trip_count,
+            observation_count = EXCLUDED.observation_count;
+    """)
+    return cur.rowcount
+
+
+if __name__ == "__main__":
+    from main import DBHandler, DB_CONFIG
+
+    with DBHandler(DB_CONFIG) as cur:
+        rows = backfill_trip_latest(cur)
+        routes = backfill_routes(cur)
+    print(f"Backfilled {rows} rows into trip_latest and {routes} rows into routes")
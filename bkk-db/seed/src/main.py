@@ -1,8 +1,14 @@
+import argparse
+import io
 import os
-import random
+import struct
+import tempfile
+import time
+import numpy as np
 import psycopg2
-from datetime import datetime, timezone, timedelta
-from typing import List, Dict
+from datetime import date, datetime, timezone, timedelta
+from typing import Dict, Iterable, Iterator, List, Tuple
+from rollup import refresh_trip_stats_daily
 
 
 ROUTES = ["0050", "0070", "0090"]
@@ -15,11 +21,25 @@ DB_CONFIG = {
     "port": os.getenv("POSTGRES_PORT", 5432),
 }
 
+TZ = os.getenv("TZ", "Europe/Budapest")
+
 FIRST_TRIP_HOUR = 4
 LAST_TRIP_HOUR = 24
 TRIP_BASE_DURATION_MIN = 60
 PEAK_HOURS = [(7, 10), (15, 18)]
 COLLECTION_OFFSET_MIN = 30
+TRIP_GAP_MIN = 10
+DURATION_VARIANCE = 2
+PEAK_EXTRA_MIN_MIN = 5
+PEAK_EXTRA_MIN_MAX = 15
+END_TIME_VARIANCE_SEC = 30
+TRIP_ID_MIN = 1000
+TRIP_ID_MAX = 9999
+
+PG_EPOCH = date(2000, 1, 1)
+COPY_HEADER = b"PGCOPY\n\xff\r\n\x00" + struct.pack(">ii", 0, 0)
+COPY_TRAILER = struct.pack(">h", -1)
+COPY_COLUMNS = "route_id, trip_id, start_time, end_time, collected_at"
 
 
 class DBHandler:
@@ -38,119 +58,330 @@ class DBHandler:
         self.conn.close()
 
     def _create_table(self):
+        self.cur.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass('trips')")
+        row = self.cur.fetchone()
+        if row and row[0] == "r":
+            raise RuntimeError(
+                "trips is a plain table from before partitioning; "
+                "apply bkk-db/postgres/init.sql to migrate it, then run the seeder again"
+            )
         self.cur.execute("""
         CREATE TABLE IF NOT EXISTS trips (
-            id BIGSERIAL PRIMARY KEY,
+            id BIGSERIAL,
             route_id TEXT NOT NULL,
             trip_id TEXT NOT NULL,
             start_time TIMESTAMPTZ,
             end_time TIMESTAMPTZ,
-            collected_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
-        );
+            collected_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+            PRIMARY KEY (id, collected_at)
+        ) PARTITION BY RANGE (collected_at);
+        """)
+        self.cur.execute("""
+        CREATE TABLE IF NOT EXISTS trips_default
+        PARTITION OF trips DEFAULT;
+        """)
+        self.cur.execute("""
+        CREATE INDEX IF NOT EXISTS idx_trips_route_start
+        ON trips (route_id, start_time);
         """)
         self.cur.execute("""
         CREATE INDEX IF NOT EXISTS idx_trips_route_trip_latest
         ON trips (route_id, trip_id, collected_at DESC);
         """)
+        self.cur.execute("""
+        CREATE INDEX IF NOT EXISTS idx_trips_collected_at_brin
+        ON trips USING BRIN (collected_at);
+        """)
+        self.cur.execute("""
+        CREATE INDEX IF NOT EXISTS idx_trips_start_time_brin
+        ON trips USING BRIN (start_time);
+        """)
+        self.cur.execute("""
+        CREATE TABLE IF NOT EXISTS trip_latest (
+            route_id TEXT NOT NULL,
+            trip_id TEXT NOT NULL,
+            start_time TIMESTAMPTZ,
+            end_time TIMESTAMPTZ,
+            collected_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+            PRIMARY KEY (route_id, trip_id)
+        );
+        """)
+        self.cur.execute("""
+        CREATE INDEX IF NOT EXISTS idx_trip_latest_route_start
+        ON trip_latest (route_id, start_time);
+        """)
+        self.cur.execute("""
+        CREATE TABLE IF NOT EXISTS routes (
+            route_id TEXT PRIMARY KEY,
+            first_seen TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+            last_seen TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+            trip_count BIGINT NOT NULL DEFAULT 0,
+            observation_count BIGINT NOT NULL DEFAULT 0
+        );
+        """)
+        self.cur.execute("""
+        CREATE TABLE IF NOT EXISTS collector_instances (
+            instance_id TEXT PRIMARY KEY,
+            started_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+            heartbeat_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+        );
+        """)
+        self.cur.execute("""
+        CREATE TABLE IF NOT EXISTS trip_stats_daily (
+            route_id TEXT NOT NULL,
+            local_date DATE NOT NULL,
+            period TEXT NOT NULL,
+            total_minutes DOUBLE PRECISION NOT NULL,
+            trip_count INTEGER NOT NULL,
+            min_minutes DOUBLE PRECISION NOT NULL,
+            max_minutes DOUBLE PRECISION NOT NULL,
+            duration_sketch JSONB NOT NULL,
+            updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+            PRIMARY KEY (route_id, local_date, period)
+        );
+        """)
+        self.cur.execute("""
+        CREATE TABLE IF NOT EXISTS trip_stats_watermark (
+            id BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (id),
+            rolled_through DATE NOT NULL
+        );
+        """)
+        self.cur.execute("""
+        ALTER TABLE trip_stats_daily ADD COLUMN IF NOT EXISTS duration_sketch JSONB;
+        DELETE FROM trip_stats_watermark
+        WHERE EXISTS (SELECT 1 FROM trip_stats_daily WHERE duration_sketch IS NULL);
+        DELETE FROM trip_stats_daily WHERE duration_sketch IS NULL;
+        ALTER TABLE trip_stats_daily ALTER COLUMN duration_sketch SET NOT NULL;
+        """)
 
 
 class TripGenerator:
-    def __init__(self, peak_hours=PEAK_HOURS):
+    def __init__(self, interval_seconds: int = 60, peak_hours=PEAK_HOURS, seed: int | None = None):
+        self.interval = interval_seconds
         self.peak_hours = peak_hours
-
-    def generate_trips_for_day(self, route_id: str, base_date: datetime.date) -> List[Dict]:
-        trips = []
-
-        DURATION_VARIANCE = 2
-        PEAK_EXTRA_MIN_MIN = 5
-        PEAK_EXTRA_MIN_MAX = 15
-
-        first_trip_time = datetime.combine(base_date, datetime.min.time()) + timedelta(
-            hours=FIRST_TRIP_HOUR
-        )
-        last_trip_time = datetime.combine(base_date, datetime.min.time()) + timedelta(
-            hours=LAST_TRIP_HOUR
+        self.rng = np.random.default_rng(seed)
+
+    def generate_day(self, route_id: str, base_date: date) -> Tuple[bytes, bytes, Dict[str, int]]:
+        rng = self.rng
+        max_trips = (LAST_TRIP_HOUR - FIRST_TRIP_HOUR) * 60 // (TRIP_GAP_MIN - DURATION_VARIANCE) + 1
+        gaps = TRIP_GAP_MIN + rng.integers(-DURATION_VARIANCE, DURATION_VARIANCE + 1, max_trips)
+        start_min = FIRST_TRIP_HOUR * 60 + np.concatenate(([0], np.cumsum(gaps[:-1])))
+        start_min = start_min[start_min < LAST_TRIP_HOUR * 60]
+        n = len(start_min)
+
+        duration_min = TRIP_BASE_DURATION_MIN + rng.integers(-DURATION_VARIANCE, DURATION_VARIANCE + 1, n)
+        hour = start_min // 60
+        peak = np.zeros(n, dtype=bool)
+        for first, last in self.peak_hours:
+            peak |= (hour >= first) & (hour < last)
+        duration_min += np.where(peak, rng.integers(PEAK_EXTRA_MIN_MIN, PEAK_EXTRA_MIN_MAX + 1, n), 0)
+
+        day_s = (base_date - PG_EPOCH).days * 86400
+        start_s = day_s + start_min * 60
+        end_s = start_s + duration_min * 60
+        first_s = start_s - COLLECTION_OFFSET_MIN * 60
+        counts = (end_s + COLLECTION_OFFSET_MIN * 60 - first_s) // self.interval + 1
+
+        trip_idx = np.repeat(np.arange(n), counts)
+        offsets = np.repeat(np.cumsum(counts) - counts, counts)
+        collected_s = first_s[trip_idx] + (np.arange(len(trip_idx)) - offsets) * self.interval
+        within = (collected_s >= start_s[trip_idx]) & (collected_s <= end_s[trip_idx])
+        effective_end_s = end_s[trip_idx] + np.where(
+            within, rng.integers(-END_TIME_VARIANCE_SEC, END_TIME_VARIANCE_SEC + 1, len(trip_idx)), 0
         )
 
-        trip_start = first_trip_time
-        while trip_start < last_trip_time:
-            duration = timedelta(minutes=TRIP_BASE_DURATION_MIN + random.randint(-DURATION_VARIANCE, DURATION_VARIANCE))
-            if any(start <= trip_start.hour < end for start, end in self.peak_hours):
-                duration += timedelta(minutes=random.randint(PEAK_EXTRA_MIN_MIN, PEAK_EXTRA_MIN_MAX))
-            trip_end = trip_start + duration
-
-            trip_id = self._generate_trip_id(route_id, trip_start)
-
-            trips.extend(self._generate_collected_times(route_id, trip_id, trip_start, trip_end))
-
-            trip_start += timedelta(minutes=10 + random.randint(-DURATION_VARIANCE, DURATION_VARIANCE))
-
-        return trips
+        trip_ids = self._trip_ids(route_id, start_min, rng.integers(TRIP_ID_MIN, TRIP_ID_MAX + 1, n))
+        last_collected_s = first_s + (counts - 1) * self.interval
+        rows = self._copy_rows(
+            route_id, trip_ids[trip_idx], start_s[trip_idx], effective_end_s, collected_s
+        )
+        latest = self._copy_rows(route_id, trip_ids, start_s, end_s, last_collected_s)
+        stats = {
+            "trips": n,
+            "rows": len(trip_idx),
+            "first_seen": int(first_s.min()),
+            "last_seen": int(last_collected_s.max()),
+        }
+        return rows, latest, stats
 
     @staticmethod
-    def _generate_trip_id(route_id: str, trip_start: datetime) -> str:
-        TRIP_ID_MIN = 1000
-        TRIP_ID_MAX = 9999
-        return f"{route_id}_{trip_start.strftime('%H%M')}_{random.randint(TRIP_ID_MIN,TRIP_ID_MAX)}"
+    def _trip_ids(route_id: str, start_min: np.ndarray, suffixes: np.ndarray) -> np.ndarray:
+        prefix = np.frombuffer(f"{route_id}_".encode(), dtype=np.uint8)
+        hhmm = (start_min // 60) * 100 + start_min % 60
+        digits = [(hhmm // 10 ** k) % 10 for k in (3, 2, 1, 0)] + [np.full(len(hhmm), ord("_") - 48)]
+        digits += [(suffixes // 10 ** k) % 10 for k in (3, 2, 1, 0)]
+        chars = np.empty((len(hhmm), len(prefix) + len(digits)), dtype=np.uint8)
+        chars[:, :len(prefix)] = prefix
+        chars[:, len(prefix):] = np.stack(digits, axis=1) + 48
+        return chars.view(f"S{chars.shape[1]}").ravel()
 
     @staticmethod
-    def _generate_collected_times(route_id: str, trip_id: str, start: datetime, end: datetime) -> List[Dict]:
-        collected_times = []
-        current_collected = start - timedelta(minutes=COLLECTION_OFFSET_MIN)
-        collected_end = end + timedelta(minutes=COLLECTION_OFFSET_MIN)
-
-        END_TIME_VARIANCE_SEC = 30
-        while current_collected <= collected_end:
-            effective_end = end if current_collected < start or current_collected > end else end + timedelta(
-                seconds=random.randint(-END_TIME_VARIANCE_SEC, END_TIME_VARIANCE_SEC)
-            )
-            collected_times.append({
-                "route_id": route_id,
-                "trip_id": trip_id,
-                "start_time": start,
-                "end_time": effective_end,
-                "collected_at": current_collected
-            })
-            current_collected += timedelta(minutes=1)
-
-        return collected_times
+    def _copy_rows(
+        route_id: str, trip_ids: np.ndarray, start_s: np.ndarray, end_s: np.ndarray, collected_s: np.ndarray
+    ) -> bytes:
+        route = route_id.encode()
+        trip_len = trip_ids.dtype.itemsize
+        row = np.dtype([
+            ("fields", ">i2"),
+            ("route_len", ">i4"), ("route_id", f"S{len(route)}"),
+            ("trip_len", ">i4"), ("trip_id", f"S{trip_len}"),
+            ("start_len", ">i4"), ("start_time", ">i8"),
+            ("end_len", ">i4"), ("end_time", ">i8"),
+            ("collected_len", ">i4"), ("collected_at", ">i8"),
+        ])
+        out = np.empty(len(trip_ids), dtype=row)
+        out["fields"] = 5
+        out["route_len"], out["route_id"] = len(route), route
+        out["trip_len"], out["trip_id"] = trip_len, trip_ids
+        out["start_len"] = out["end_len"] = out["collected_len"] = 8
+        out["start_time"] = start_s * 1_000_000
+        out["end_time"] = end_s * 1_000_000
+        out["collected_at"] = collected_s * 1_000_000
+        return out.tobytes()
+
+
+class CopyStream(io.RawIOBase):
+    def __init__(self, chunks: Iterable[bytes]):
+        self._chunks = iter(chunks)
+        self._buffer = memoryview(b"")
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        while not self._buffer:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                return 0
+            self._buffer = memoryview(chunk)
+        size = min(len(b), len(self._buffer))
+        b[:size] = self._buffer[:size]
+        self._buffer = self._buffer[size:]
+        return size
 
 
 class TripSeeder:
-    def __init__(self, routes: List[str], db_config: Dict, days_back: int = 7):
+    def __init__(
+        self, routes: List[str], db_config: Dict, days_back: int = 7, interval_seconds: int = 60,
+        seed: int | None = None
+    ):
+        if days_back < 1:
+            raise ValueError("days_back must be at least 1")
+        if interval_seconds < 1:
+            raise ValueError("interval_seconds must be at least 1")
         self.routes = routes
         self.days_back = days_back
-        self.generator = TripGenerator()
+        self.generator = TripGenerator(interval_seconds=interval_seconds, seed=seed)
         self.db_config = db_config
+        self.route_stats: Dict[str, Dict[str, int]] = {}
 
-    def seed(self):
+    def _days(self) -> List[date]:
         today = datetime.now(timezone.utc).date()
-        all_rows = []
-
-        for days_ago in range(self.days_back, 0, -1):
-            date_to_seed = today - timedelta(days=days_ago)
+        return [today - timedelta(days=days_ago) for days_ago in range(self.days_back, 0, -1)]
+
+    def _chunks(self, latest_file) -> Iterator[bytes]:
+        yield COPY_HEADER
+        latest_file.write(COPY_HEADER)
+        started = time.perf_counter()
+        total = 0
+        for day in self._days():
+            day_rows = 0
             for route in self.routes:
-                trips = self.generator.generate_trips_for_day(route, date_to_seed)
-                all_rows.extend(trips)
-
-        all_rows.sort(key=lambda x: x["collected_at"])
-
-        with DBHandler(self.db_config) as cur:
-            for row in all_rows:
-                cur.execute("""
-                    INSERT INTO trips (route_id, trip_id, start_time, end_time, collected_at)
-                    VALUES (%s, %s, %s, %s, %s)
-                """, (
-                    row["route_id"],
-                    row["trip_id"],
-                    row["start_time"],
-                    row["end_time"],
-                    row["collected_at"],
-                ))
+                rows, latest, stats = self.generator.generate_day(route, day)
+                latest_file.write(latest)
+                self._track(route, stats)
+                day_rows += stats["rows"]
+                yield rows
+            total += day_rows
+            elapsed = time.perf_counter() - started
+            print(f"Generated {day}: {day_rows} rows, {total} total ({total / elapsed:.0f} rows/s)", flush=True)
+        latest_file.write(COPY_TRAILER)
+        yield COPY_TRAILER
+
+    def _track(self, route: str, stats: Dict[str, int]) -> None:
+        seen = self.route_stats.setdefault(
+            route, {"trips": 0, "rows": 0, "first_seen": stats["first_seen"], "last_seen": 0}
+        )
+        seen["trips"] += stats["trips"]
+        seen["rows"] += stats["rows"]
+        seen["first_seen"] = min(seen["first_seen"], stats["first_seen"])
+        seen["last_seen"] = max(seen["last_seen"], stats["last_seen"])
+
+    def write_file(self, path: str) -> None:
+        with open(path, "wb") as f, tempfile.TemporaryFile() as latest_file:
+            for chunk in self._chunks(latest_file):
+                f.write(chunk)
+        print(f"Wrote binary COPY data for trips ({COPY_COLUMNS}) to {path}")
+
+    def seed(self):
+        days = self._days()
+        with DBHandler(self.db_config) as cur, tempfile.TemporaryFile() as latest_file:
+            cur.execute(
+                "SELECT create_trip_partitions(%s, %s)", (days[0] - timedelta(days=1), days[-1] + timedelta(days=2))
+            )
+            cur.copy_expert(
+                f"COPY trips ({COPY_COLUMNS}) FROM STDIN WITH (FORMAT binary)", CopyStream(self._chunks(latest_file))
+            )
+            latest_file.seek(0)
+            self._load_trip_latest(cur, latest_file)
+            self._load_routes(cur)
+            refresh_trip_stats_daily(cur, TZ)
 
         print("Seeding complete")
 
+    @staticmethod
+    def _load_trip_latest(cur, latest_file) -> None:
+        cur.execute("CREATE TEMP TABLE trip_latest_seed (LIKE trip_latest INCLUDING DEFAULTS) ON COMMIT DROP")
+        cur.copy_expert(f"COPY trip_latest_seed ({COPY_COLUMNS}) FROM STDIN WITH (FORMAT binary)", latest_file)
+        cur.execute(f"""
+            INSERT INTO trip_latest ({COPY_COLUMNS})
+            SELECT {COPY_COLUMNS} FROM trip_latest_seed
+            ON CONFLICT (route_id, trip_id) DO UPDATE
+            SET start_time = EXCLUDED.start_time,
+                end_time = EXCLUDED.end_time,
+                collected_at = EXCLUDED.collected_at
+            WHERE trip_latest.collected_at <= EXCLUDED.collected_at;
+        """)
+
+    def _load_routes(self, cur) -> None:
+        pg_epoch = datetime(2000, 1, 1, tzinfo=timezone.utc)
+        for route, seen in self.route_stats.items():
+            cur.execute("""
+                INSERT INTO routes (route_id, first_seen, last_seen, trip_count, observation_count)
+                VALUES (%s, %s, %s, %s, %s)
+                ON CONFLICT (route_id) DO UPDATE
+                SET first_seen = LEAST(routes.first_seen, EXCLUDED.first_seen),
+                    last_seen = GREATEST(routes.last_seen, EXCLUDED.last_seen),
+                    trip_count = routes.trip_count + EXCLUDED.trip_count,
+                    observation_count = routes.observation_count + EXCLUDED.observation_count;
+            """, (
+                route,
+                pg_epoch + timedelta(seconds=seen["first_seen"]),
+                pg_epoch + timedelta(seconds=seen["last_seen"]),
+                seen["trips"],
+                seen["rows"],
+            ))
+
+
+def route_ids(count: int) -> List[str]:
+    extra = (f"{i:04d}" for i in range(1, 10000) if f"{i:04d}" not in ROUTES)
+    return (ROUTES + [next(extra) for _ in range(max(0, count - len(ROUTES)))])[:count]
+
 
 if __name__ == "__main__":
-    seeder = TripSeeder(ROUTES, DB_CONFIG, days_back=7)
-    seeder.seed()
+    parser = argparse.ArgumentParser(description="Seed bkk-db with synthetic trip snapshots")
+    parser.add_argument("--routes", type=int, default=len(ROUTES), help="Number of routes, starting with the demo routes")
+    parser.add_argument("--days", type=int, default=7, help="Number of days before today to generate")
+    parser.add_argument("--interval-seconds", type=int, default=60, help="Seconds between snapshots of a trip")
+    parser.add_argument("--seed", type=int, help="Random seed for reproducible data")
+    parser.add_argument("--output", help="Write binary COPY data for trips to this file instead of the database")
+    args = parser.parse_args()
+    for name in ("routes", "days", "interval_seconds"):
+        if getattr(args, name) < 1:
+            parser.error(f"--{name.replace('_', '-')} must be at least 1")
+
+    seeder = TripSeeder(route_ids(args.routes), DB_CONFIG, args.days, args.interval_seconds, args.seed)
+    if args.output:
+        seeder.write_file(args.output)
+    else:
+        seeder.seed()
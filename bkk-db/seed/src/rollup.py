@@ -0,0 +1,28 @@
+import argparse
+from datetime import date
+
+
+def refresh_trip_stats_daily(cur, tz: str) -> int:
+    cur.execute("SELECT refresh_trip_stats_daily(%s)", (tz,))
+    return cur.fetchone()[0]
+
+
+def rebuild_trip_stats_daily(cur, from_date: date, to_date: date, tz: str) -> int:
+    cur.execute("SELECT rebuild_trip_stats_daily(%s, %s, %s)", (from_date, to_date, tz))
+    return cur.fetchone()[0]
+
+
+if __name__ == "__main__":
+    from main import DBHandler, DB_CONFIG, TZ
+
+    parser = argparse.ArgumentParser(description="Rebuild the trip_stats_daily rollups")
+    parser.add_argument("--from", dest="from_date", type=date.fromisoformat, help="YYYY-MM-DD")
+    parser.add_argument("--to", dest="to_date", type=date.fromisoformat, help="YYYY-MM-DD")
+    args = parser.parse_args()
+
+    with DBHandler(DB_CONFIG) as cur:
+        if args.from_date and args.to_date:
+            rows = rebuild_trip_stats_daily(cur, args.from_date, args.to_date, TZ)
+        else:
+            rows = refresh_trip_stats_daily(cur, TZ)
+    print(f"Rebuilt {rows} rows in trip_stats_daily")
@@ -1,18 +1,51 @@
 import os
+from typing import AsyncIterator, Tuple
 import httpx
+import metrics
 
 class ApiClient:
     def __init__(self):
         self.base_url = os.environ.get("API_BASE_URL", "http://api:8000/api/trips")
+        self.timeout = float(os.environ.get("API_TIMEOUT_SECONDS", "30"))
+        self.updates_timeout = float(os.environ.get("API_UPDATES_TIMEOUT_SECONDS", "60"))
+        self.client = httpx.AsyncClient(
+            base_url=self.base_url,
+            timeout=self.timeout,
+            limits=httpx.Limits(
+                max_connections=int(os.environ.get("API_MAX_CONNECTIONS", "20")),
+                max_keepalive_connections=int(os.environ.get("API_MAX_CONNECTIONS", "20")),
+            ),
+        )
 
     async def get_routes(self):
-        async with httpx.AsyncClient() as client:
-            resp = await client.get(f"{self.base_url}/routes")
-            data = resp.json()
-            return data
+        async with metrics.upstream("routes"):
+            resp = await self.client.get("/routes")
+            resp.raise_for_status()
+        return resp.json()
 
     async def get_route(self, route_id: str):
-        async with httpx.AsyncClient() as client:
-            resp = await client.get(f"{self.base_url}/find/{route_id}")
-            data = resp.json()
-            return data
+        async with metrics.upstream("find"):
+            resp = await self.client.get(f"/find/{route_id}")
+            resp.raise_for_status()
+        return resp.json()
+
+    async def iter_updates(self) -> AsyncIterator[Tuple[str, str]]:
+        event, data = "message", []
+        timeout = httpx.Timeout(self.timeout, read=self.updates_timeout)
+        async with self.client.stream("GET", "/updates", timeout=timeout) as resp:
+            resp.raise_for_status()
+            async for line in resp.aiter_lines():
+                if not line:
+                    if data:
+                        yield event, "\n".join(data)
+                    event, data = "message", []
+                elif not line.startswith(":"):
+                    field, _, value = line.partition(":")
+                    value = value[1:] if value.startswith(" ") else value
+                    if field == "event":
+                        event = value
+                    elif field == "data":
+                        data.append(value)
+
+    async def aclose(self):
+        await self.client.aclose()
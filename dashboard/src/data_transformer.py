@@ -1,25 +1,41 @@
-def transform_to_vizzu(api_data: dict) -> dict:
-    series_date = []
-    series_day = []
-    series_period = []
-    series_deviation = []
+from typing import Dict, Iterable, List, Tuple
+
+RowKey = Tuple[str, str]
 
+def period_rows(api_data: dict) -> Dict[RowKey, dict]:
+    rows: Dict[RowKey, dict] = {}
     for day_obj in api_data.get("days", []):
         date = day_obj["date"]
         day_name = day_obj["day"]
         avg = day_obj["avg_minutes"]
 
         for period, value in day_obj["periods"].items():
-            series_date.append(date)
-            series_day.append(day_name)
-            series_period.append(period)
-            series_deviation.append(value - avg)
+            rows[(date, period)] = {
+                "Date": date,
+                "Day": day_name,
+                "Period": period,
+                "Deviation(min) from avg": value - avg,
+            }
+    return rows
+
+def diff_rows(old: Dict[RowKey, dict], new: Dict[RowKey, dict]) -> Tuple[List[dict], List[dict]]:
+    changed = [row for key, row in new.items() if old.get(key) != row]
+    removed = [{"Date": date, "Period": period} for date, period in old if (date, period) not in new]
+    return changed, removed
 
+def rows_to_vizzu(rows: Iterable[dict]) -> dict:
+    rows = list(rows)
     return {
         "series": [
-            {"name": "Date", "type": "dimension", "values": series_date},
-            {"name": "Day", "type": "dimension", "values": series_day},
-            {"name": "Period", "type": "dimension", "values": series_period},
-            {"name": "Deviation(min) from avg", "type": "measure", "values": series_deviation},
+            {"name": "Date", "type": "dimension", "values": [r["Date"] for r in rows]},
+            {"name": "Day", "type": "dimension", "values": [r["Day"] for r in rows]},
+            {"name": "Period", "type": "dimension", "values": [r["Period"] for r in rows]},
+            {
+                "name": "Deviation(min) from avg", "type": "measure",
+                "values": [r["Deviation(min) from avg"] for r in rows]
+            },
         ]
     }
+
+def transform_to_vizzu(api_data: dict) -> dict:
+    return rows_to_vizzu(period_rows(api_data).values())
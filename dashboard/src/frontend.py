@@ -41,6 +41,12 @@ def get_html():
     import Vizzu from 'https://cdn.jsdelivr.net/npm/vizzu@0.17/dist/vizzu.min.js';
 
     let chart = new Vizzu('chartContainer');
+    chart.feature('tooltip', true);
+
+    const MEASURE = "Deviation(min) from avg";
+    let source = null;
+    let rows = new Map();
+    let periodOrder = [];
 
     async function loadRoutes() {
         const resp = await fetch('/routes');
@@ -56,23 +62,34 @@ def get_html():
         if (data.routes.length > 0) {
             const firstRoute = data.routes[0];
             select.value = firstRoute;
-            loadStats(firstRoute);
+            watchRoute(firstRoute);
         }
     }
 
-    async function loadStats(routeId) {
-        const resp = await fetch('/route/' + routeId);
-        const apiData = await resp.json();
-
-        const vizzuData = await fetch('/transform/' + routeId).then(r => r.json());
+    function setRow(row) {
+        if (!periodOrder.includes(row.Period)) {
+            periodOrder.push(row.Period);
+        }
+        rows.set(row.Date + '|' + row.Period, row);
+    }
 
-        chart.feature('tooltip', true);
+    function render() {
+        const ordered = [...rows.values()].sort((a, b) =>
+            a.Date.localeCompare(b.Date) || periodOrder.indexOf(a.Period) - periodOrder.indexOf(b.Period)
+        );
 
         chart.animate({
-            data: vizzuData,
+            data: {
+                series: [
+                    {name: "Date", type: "dimension", values: ordered.map(r => r.Date)},
+                    {name: "Day", type: "dimension", values: ordered.map(r => r.Day)},
+                    {name: "Period", type: "dimension", values: ordered.map(r => r.Period)},
+                    {name: MEASURE, type: "measure", values: ordered.map(r => r[MEASURE])}
+                ]
+            },
             config: {
                 x: ["Day", "Period"],
-                y: "Deviation(min) from avg",
+                y: MEASURE,
                 color: "Period"
             },
             style: {
@@ -83,8 +100,28 @@ def get_html():
         });
     }
 
+    function watchRoute(routeId) {
+        if (source) {
+            source.close();
+        }
+        // The server sends the full state first and then only the changed day/period values.
+        source = new EventSource('/live/' + encodeURIComponent(routeId));
+        source.addEventListener('snapshot', (e) => {
+            rows = new Map();
+            periodOrder = [];
+            JSON.parse(e.data).rows.forEach(setRow);
+            render();
+        });
+        source.addEventListener('update', (e) => {
+            const update = JSON.parse(e.data);
+            update.removed.forEach(r => rows.delete(r.Date + '|' + r.Period));
+            update.changed.forEach(setRow);
+            render();
+        });
+    }
+
     document.getElementById('routeSelect').addEventListener('change', (e) => {
-        loadStats(e.target.value);
+        watchRoute(e.target.value);
     });
 
     loadRoutes();
@@ -0,0 +1,125 @@
+import asyncio
+import json
+import logging
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterable, Set
+from api_client import ApiClient
+from data_transformer import RowKey, diff_rows, period_rows
+import metrics
+
+logger = logging.getLogger(__name__)
+
+def _event(name: str, payload: Dict[str, Any]) -> str:
+    return f"event: {name}\ndata: {json.dumps(payload, separators=(',', ':'))}\n\n"
+
+class RouteUpdateHub:
+    def __init__(
+        self, api_client: ApiClient, load_view: Callable[..., Awaitable[dict]],
+        heartbeat_seconds: float = 15.0, retry_seconds: float = 5.0, max_pending: int = 16
+    ):
+        self.api_client = api_client
+        self.load_view = load_view
+        self.heartbeat_seconds = heartbeat_seconds
+        self.retry_seconds = retry_seconds
+        self.max_pending = max_pending
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = {}
+        self._rows: Dict[str, Dict[RowKey, dict]] = {}
+        self._refreshing: Dict[str, asyncio.Task] = {}
+        self._dirty: Set[str] = set()
+        self._follower: asyncio.Task | None = None
+
+    def start(self) -> None:
+        self._follower = asyncio.create_task(self._follow_upstream())
+
+    async def stop(self) -> None:
+        tasks = [t for t in (self._follower, *self._refreshing.values()) if t is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _follow_upstream(self) -> None:
+        while True:
+            try:
+                async for event, data in self.api_client.iter_updates():
+                    if event == "trips_updated":
+                        self._refresh_routes(r for r in data.split(",") if r)
+                    elif event == "reset":
+                        self._refresh_routes(list(self._subscribers))
+                logger.warning("Update stream from the api ended, reconnecting")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("Update stream from the api failed, reconnecting: %s", e)
+            # Updates may have been missed while disconnected.
+            self._refresh_routes(list(self._subscribers))
+            await asyncio.sleep(self.retry_seconds)
+
+    def _refresh_routes(self, route_ids: Iterable[str]) -> None:
+        for route_id in route_ids:
+            if route_id not in self._subscribers:
+                continue
+            if route_id in self._refreshing:
+                self._dirty.add(route_id)
+            else:
+                self._refreshing[route_id] = asyncio.create_task(self._refresh(route_id))
+
+    async def _refresh(self, route_id: str) -> None:
+        try:
+            while route_id in self._subscribers:
+                self._dirty.discard(route_id)
+                try:
+                    view = await self.load_view(route_id, refresh=True)
+                except Exception as e:
+                    logger.warning("Refreshing route %s failed: %s", route_id, e)
+                    return
+                metrics.LIVE_REFRESHES.inc()
+                self._publish(route_id, period_rows(view["stats"]))
+                if route_id not in self._dirty:
+                    return
+        finally:
+            self._refreshing.pop(route_id, None)
+
+    def _publish(self, route_id: str, rows: Dict[RowKey, dict]) -> None:
+        if route_id not in self._subscribers:
+            return
+        changed, removed = diff_rows(self._rows.get(route_id, {}), rows)
+        self._rows[route_id] = rows
+        if not changed and not removed:
+            return
+        update = _event("update", {"route_id": route_id, "changed": changed, "removed": removed})
+        for queue in self._subscribers[route_id]:
+            if queue.full():
+                # A client that fell behind gets the current state instead of the missed updates.
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(self._snapshot(route_id))
+            else:
+                queue.put_nowait(update)
+        metrics.LIVE_UPDATES_SENT.inc(len(self._subscribers[route_id]))
+
+    def _snapshot(self, route_id: str) -> str:
+        return _event("snapshot", {"route_id": route_id, "rows": list(self._rows[route_id].values())})
+
+    async def stream(self, route_id: str) -> AsyncIterator[str]:
+        if route_id not in self._rows:
+            view = await self.load_view(route_id)
+            self._rows.setdefault(route_id, period_rows(view["stats"]))
+        # The snapshot and later updates come from the same shared state, so diffs always apply on top of it.
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.max_pending)
+        self._subscribers.setdefault(route_id, set()).add(queue)
+        metrics.LIVE_SUBSCRIBERS.inc()
+        try:
+            yield "retry: 5000\n\n"
+            yield self._snapshot(route_id)
+            while True:
+                try:
+                    yield await asyncio.wait_for(queue.get(), self.heartbeat_seconds)
+                except asyncio.TimeoutError:
+                    yield ": ping\n\n"
+        finally:
+            metrics.LIVE_SUBSCRIBERS.dec()
+            watchers = self._subscribers.get(route_id)
+            if watchers is not None:
+                watchers.discard(queue)
+                if not watchers:
+                    del self._subscribers[route_id]
+                    self._rows.pop(route_id, None)
@@ -1,26 +1,74 @@
+import os
+from contextlib import asynccontextmanager
+import httpx
 from fastapi import FastAPI
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi.responses import HTMLResponse, JSONResponse, StreamingResponse
 from api_client import ApiClient
 from data_transformer import transform_to_vizzu
 from frontend import get_html
+from stats_cache import CoalescingTTLCache
+from live_updates import RouteUpdateHub
+from metrics import MetricsMiddleware, metrics_endpoint
 
 def create_app() -> FastAPI:
-    app = FastAPI(title="BKK Dashboard")
     api_client = ApiClient()
+    cache = CoalescingTTLCache(float(os.environ.get("DASHBOARD_CACHE_TTL_SECONDS", "30")))
+
+    async def load_view(route_id: str, refresh: bool = False) -> dict:
+        async def load():
+            stats = await api_client.get_route(route_id)
+            return {"stats": stats, "vizzu": transform_to_vizzu(stats)}
+        if refresh:
+            cache.invalidate(("view", route_id))
+        return await cache.get_or_load(("view", route_id), load)
+
+    hub = RouteUpdateHub(
+        api_client, load_view,
+        heartbeat_seconds=float(os.environ.get("DASHBOARD_LIVE_HEARTBEAT_SECONDS", "15")),
+        retry_seconds=float(os.environ.get("DASHBOARD_LIVE_RETRY_SECONDS", "5")),
+    )
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        hub.start()
+        yield
+        await hub.stop()
+        await api_client.aclose()
+
+    app = FastAPI(title="BKK Dashboard", lifespan=lifespan)
+    app.add_route("/metrics", metrics_endpoint, include_in_schema=False)
+    app.add_middleware(MetricsMiddleware)
+
+    @app.exception_handler(httpx.HTTPStatusError)
+    async def upstream_error(request, exc: httpx.HTTPStatusError):
+        status = exc.response.status_code
+        return JSONResponse(
+            status_code=status if status < 500 else 502, content={"detail": f"API responded with {status}"}
+        )
 
     @app.get("/routes")
     async def routes():
-        return await api_client.get_routes()
+        return await cache.get_or_load(("routes",), api_client.get_routes)
 
     @app.get("/route/{route_id}")
     async def route(route_id: str):
-        return await api_client.get_route(route_id)
+        return (await load_view(route_id))["stats"]
 
     @app.get("/transform/{route_id}")
     async def route_transform(route_id: str):
-        stats = await api_client.get_route(route_id)
-        data = transform_to_vizzu(stats)
-        return JSONResponse(content=data)
+        return JSONResponse(content=(await load_view(route_id))["vizzu"])
+
+    @app.get("/view/{route_id}")
+    async def route_view(route_id: str):
+        return await load_view(route_id)
+
+    @app.get("/live/{route_id}")
+    async def route_live(route_id: str):
+        return StreamingResponse(
+            hub.stream(route_id),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+        )
 
     @app.get("/", response_class=HTMLResponse)
     async def index():
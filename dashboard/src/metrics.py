@@ -0,0 +1,76 @@
+import time
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import AsyncIterator, Dict, Optional
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+from starlette.requests import Request
+from starlette.responses import Response
+
+REQUEST_SECONDS = Histogram(
+    "dashboard_request_duration_seconds", "Request latency by handler", ["method", "handler", "status"],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+)
+UPSTREAM_SECONDS = Histogram(
+    "dashboard_upstream_seconds", "API call latency seen by the dashboard", ["call"],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+)
+UPSTREAM_ERRORS = Counter("dashboard_upstream_errors_total", "Failed API calls", ["call"])
+LIVE_SUBSCRIBERS = Gauge("dashboard_live_subscribers", "Open live update streams")
+LIVE_REFRESHES = Counter("dashboard_live_refreshes_total", "Route views recomputed for live updates")
+LIVE_UPDATES_SENT = Counter("dashboard_live_updates_sent_total", "Live update events queued to clients")
+
+_request_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar("request_timings", default=None)
+
+@asynccontextmanager
+async def upstream(call: str) -> AsyncIterator[None]:
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        UPSTREAM_ERRORS.labels(call).inc()
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        UPSTREAM_SECONDS.labels(call).observe(elapsed)
+        timings = _request_timings.get()
+        if timings is not None:
+            timings["upstream"] = timings.get("upstream", 0.0) + elapsed
+
+def server_timing(timings: Dict[str, float], total: float) -> str:
+    entries = [f"{name};dur={seconds * 1000:.2f}" for name, seconds in timings.items()]
+    entries.append(f"total;dur={total * 1000:.2f}")
+    return ", ".join(entries)
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings: Dict[str, float] = {}
+        token = _request_timings.set(timings)
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                header = server_timing(timings, time.perf_counter() - started)
+                message["headers"] = [*message.get("headers", ()), (b"server-timing", header.encode("latin-1"))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            endpoint = scope.get("endpoint")
+            REQUEST_SECONDS.labels(
+                scope["method"], getattr(endpoint, "__name__", "unmatched"), str(status)
+            ).observe(time.perf_counter() - started)
+            _request_timings.reset(token)
+
+def metrics_endpoint(request: Request) -> Response:
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
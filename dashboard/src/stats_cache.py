@@ -0,0 +1,46 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+class CoalescingTTLCache:
+    def __init__(self, ttl_seconds: float, max_entries: int = 256):
+        self.ttl = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+
+    async def get_or_load(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] > time.monotonic():
+            self._entries.move_to_end(key)
+            return entry[1]
+
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._load(key, loader))
+            # Retrieve the outcome so a failure nobody awaits any more is not reported as unhandled.
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+            self._inflight[key] = task
+        # A disconnecting client cancels only its own wait, not the shared upstream fetch.
+        return await asyncio.shield(task)
+
+    def invalidate(self, key: Hashable) -> None:
+        self._entries.pop(key, None)
+        # Callers already waiting keep their load, but its result is not cached and new callers start afresh.
+        self._inflight.pop(key, None)
+
+    async def _load(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        task = asyncio.current_task()
+        try:
+            value = await loader()
+        finally:
+            current = self._inflight.get(key) is task
+            if current:
+                del self._inflight[key]
+        if current and self.ttl > 0:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return value